@@ -0,0 +1,106 @@
+"""
+Measures how much memory a read AST holds on to.
+
+Three layouts of the same tree are compared:
+  dict     nodes with a __dict__ and their own empty children list on
+           every leaf, the way the node classes used to be
+  slots    the slotted node classes from shisp_ast.ast
+  arena    shisp_ast.arena.Arena
+
+Usage: python3 benchmarks/bench_ast_memory.py [size_in_kb...]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from common import sample_program
+
+import lexer.tokens
+import parser
+import state
+
+from shisp_ast.arena import Arena
+
+
+class DictNode:
+    """
+    Stand in for the old (unslotted) node dataclasses.
+    """
+    def __init__(self, node, parent):
+        self.start = node.start
+        self.end = node.end
+        self.children = []
+        self.parent = parent
+        self.index = node.index
+        self.data = node.data
+        if hasattr(node, 'scope'):
+            self.scope = node.scope
+
+
+def dict_nodes(ast):
+    root = DictNode(ast.base_node, None)
+    stack = [(ast.base_node, root)]
+    while stack:
+        node, copy = stack.pop()
+        for child in node.children:
+            child_copy = DictNode(child, copy)
+            copy.children.append(child_copy)
+            stack.append((child, child_copy))
+    return root
+
+
+def retained(func, *args) -> tuple[int, object]:
+    """
+    Returns how much memory is still allocated after func returns,
+    along with what it returned (which is what holds on to it).
+
+    Anything func only used on the way is freed before measuring.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return current, result
+
+
+def read(tokens):
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    return parser.reader.read(tokens, _state)
+
+
+def count_nodes(ast) -> int:
+    count = 0
+    stack = [ast.base_node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def main(sizes: list[int]):
+    for size in sizes:
+        tokens = lexer.tokens.scan(sample_program(size * 1024))
+        ast = read(tokens)
+        nodes = count_nodes(ast)
+        print('{} KB ({} nodes):'.format(size, nodes))
+
+        # Each layout is made from a fresh read, so they all hold
+        # their own copy of the data strings.
+        results = {
+            'dict': retained(lambda: dict_nodes(read(tokens)))[0],
+            'slots': retained(read, tokens)[0],
+            'arena': retained(lambda: Arena.from_ast(read(tokens)))[0],
+        }
+        for name, held in results.items():
+            print('  {:<6} {:>8.2f} MB  {:>6.1f} B/node  {:>5.2f}x'.format(
+                name, held / 1e6, held / nodes, results['dict'] / held))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [256, 1024])
@@ -0,0 +1,61 @@
+"""
+Compiles deeply nested programs, to check that no pass recurses
+(which would hit the recursion limit) and that the time taken grows
+linearly with the depth.
+
+Usage: python3 benchmarks/bench_deep.py [depth...]
+"""
+
+import sys
+import time
+
+from common import best_time
+
+import lexer.tokens
+import parser
+import compiler.compiler
+import state
+
+
+def nested_calls(depth: int) -> str:
+    """ A call to foo inside depth Exprs. """
+    return '(let x 1)\n(defun foo (a) a)\n{}foo x{}\n'.format('(' * depth, ')' * depth)
+
+
+def nested_quote(depth: int) -> str:
+    """ A quoted list nested depth deep. """
+    return "'{}a{}\n".format('(' * depth, ')' * depth)
+
+
+PROGRAMS = {
+    'calls': nested_calls,
+    'quote': nested_quote,
+}
+
+
+def compile_source(text: str) -> str:
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    ast = parser.reader.read(lexer.tokens.scan(text), _state)
+    ast = parser.expand_metamacros.resolve_metamacros(ast)
+    ast = parser.handle_varrefs.check_variables(ast)
+    ast = parser.handle_functions.replace_references(ast)
+    return compiler.compiler.compile(ast)
+
+
+def main(depths: list[int]):
+    print('recursion limit {}'.format(sys.getrecursionlimit()))
+    for name, program in PROGRAMS.items():
+        print('{}:'.format(name))
+        for depth in depths:
+            text = program(depth)
+            try:
+                seconds = best_time(compile_source, text)
+            except RecursionError:
+                print('  depth {:>7}  RecursionError'.format(depth))
+                continue
+            print('  depth {:>7}  {:>8.3f} s  {:>6.2f} us/level'.format(
+                depth, seconds, seconds / depth * 1e6))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 20000, 40000])
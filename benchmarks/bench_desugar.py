@@ -0,0 +1,48 @@
+"""
+Times parser.desugar_source.combine_ast on wide lists where every
+element is quoted, like '(a 'b 'c ...).
+
+Usage: python3 benchmarks/bench_desugar.py [width...]
+"""
+
+import sys
+import time
+
+import common
+import lexer.tokens
+import parser
+import state
+
+from shisp_ast.ast import AST
+
+
+def wide_quoted_list(width: int) -> str:
+    """
+    Makes a list of width elements, with quote, quasiquote, unquote
+    and unquote-splice sugar on them in turn.
+    """
+    sugar = ("'", "`", ",", ",@")
+    items = ['{}item{}'.format(sugar[i % len(sugar)], i) for i in range(width)]
+    return "'({})\n".format(' '.join(items))
+
+
+def parse(text: str) -> AST:
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    return parser.parse_tokens.parse_lexemes(lexer.tokens.scan(text), _state)
+
+
+def main(widths: list[int]):
+    for width in widths:
+        text = wide_quoted_list(width)
+        times = []
+        for _ in range(3):
+            ast = parse(text)
+            start = time.perf_counter()
+            parser.desugar_source.combine_ast(ast)
+            times.append(time.perf_counter() - start)
+        elapsed = min(times)
+        print('{:>7} items  combine_ast {:>8.4f} s'.format(width, elapsed))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 2000, 4000, 8000])
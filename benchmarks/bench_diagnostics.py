@@ -0,0 +1,55 @@
+"""
+Times how long it takes to report a newline inside a String when the
+error is at the very end of a large file.
+
+Each parser is timed on the file with a good last line and again with
+a broken one, the difference is what building the diagnostic costs.
+
+Usage: python3 benchmarks/bench_diagnostics.py [size_in_kb...]
+"""
+
+import sys
+
+from common import sample_program, best_time
+
+import errors
+import lexer.tokens
+import parser
+import state
+
+
+GOOD_FORM = '(let fine "this string ends")\n'
+BAD_FORM = '(let broken "this string never ends\n'
+
+
+def parse_chars(tokens: list[lexer.tokens.Token]):
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    try:
+        parser.parse_tokens.parse_tokens(tokens, _state)
+    except errors.AbortParse:
+        assert _state.errors, 'AbortParse without an error'
+
+
+def parse_lexemes(tokens: lexer.tokens.TokenStore):
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    try:
+        parser.parse_tokens.parse_lexemes(tokens, _state)
+    except errors.AbortParse:
+        assert _state.errors, 'AbortParse without an error'
+
+
+def main(sizes: list[int]):
+    paths = (('chars', lexer.tokens.parse_file, parse_chars),
+             ('lexemes', lexer.tokens.scan, parse_lexemes))
+    for size in sizes:
+        text = sample_program(size * 1024)
+        print('{} KB:'.format(size))
+        for name, lex, parse in paths:
+            good = best_time(parse, lex(text + GOOD_FORM))
+            bad = best_time(parse, lex(text + BAD_FORM))
+            print('  {:<8} no error {:>8.3f} s  error at end {:>8.3f} s  '
+                  'diagnostic {:>8.3f} s'.format(name, good, bad, bad - good))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1024, 4096])
@@ -0,0 +1,48 @@
+"""
+Compares the per-character tokenizer (lexer.tokens.parse_file) with
+the lexeme scanner (lexer.tokens.scan).
+
+Usage: python3 benchmarks/bench_lexer.py [size_in_kb...]
+"""
+
+import sys
+
+from common import sample_program, best_time, peak_memory
+
+import lexer.tokens
+import parser
+import state
+
+
+def parse_chars(text: str):
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    return parser.parse_tokens.parse_tokens(lexer.tokens.parse_file(text), _state)
+
+
+def parse_lexemes(text: str):
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    return parser.parse_tokens.parse_lexemes(lexer.tokens.scan(text), _state)
+
+
+def report(name: str, text: str, lex, parse):
+    count = len(lex(text))
+    lex_time = best_time(lex, text)
+    lex_peak, _ = peak_memory(lex, text)
+    parse_time = best_time(parse, text)
+    parse_peak, _ = peak_memory(parse, text)
+    print('  {:<8} {:>9} tokens {:>12.0f} tokens/s {:>8.1f} MB/s '
+          'lex peak {:>8.1f} MB | lex+parse {:>7.3f} s peak {:>8.1f} MB'
+          .format(name, count, count / lex_time, len(text) / lex_time / 1e6,
+                  lex_peak / 1e6, parse_time, parse_peak / 1e6))
+
+
+def main(sizes: list[int]):
+    for size in sizes:
+        text = sample_program(size * 1024)
+        print('{} KB:'.format(size))
+        report('chars', text, lexer.tokens.parse_file, parse_chars)
+        report('lexemes', text, lexer.tokens.scan, parse_lexemes)
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [64, 256])
@@ -0,0 +1,42 @@
+"""
+Compares the single pass reader (parser.reader) with the separate
+parse, desugar and squash passes it replaces.
+
+Usage: python3 benchmarks/bench_reader.py [size_in_kb...]
+"""
+
+import sys
+
+from common import sample_program, best_time, peak_memory
+
+import lexer.tokens
+import parser
+import state
+
+
+def multipass(tokens: lexer.tokens.TokenStore):
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    ast = parser.parse_tokens.parse_lexemes(tokens, _state)
+    ast = parser.desugar_source.combine_ast(ast)
+    return parser.simplify_ast.squash_ast(ast, _state.symbols)
+
+
+def reader(tokens: lexer.tokens.TokenStore):
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    return parser.reader.read(tokens, _state)
+
+
+def main(sizes: list[int]):
+    for size in sizes:
+        tokens = lexer.tokens.scan(sample_program(size * 1024))
+        print('{} KB ({} lexemes):'.format(size, len(tokens)))
+        times = {}
+        for name, read in (('multipass', multipass), ('reader', reader)):
+            times[name] = best_time(read, tokens)
+            peak, _ = peak_memory(read, tokens)
+            print('  {:<10} {:>8.3f} s  peak {:>8.1f} MB'.format(name, times[name], peak / 1e6))
+        print('  speedup    {:>8.1f}x'.format(times['multipass'] / times['reader']))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [256, 1024])
@@ -0,0 +1,72 @@
+"""
+Shared helpers for the bootstrap compiler benchmarks.
+
+Importing this module puts src/bootstrap on sys.path, so the
+benchmarks can import the compiler modules the same way main.py does.
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from pathlib import Path
+from typing import Any, Callable
+
+
+BOOTSTRAP = Path(__file__).resolve().parent.parent / 'src' / 'bootstrap'
+sys.path.insert(0, str(BOOTSTRAP))
+
+
+SAMPLE_FORMS = """; a generated sample form
+(let value{n} {n})
+(defun func{n} (a b c) (quote (a b c)) value{n})
+(depun pure{n} (x) 'x)
+(let text{n} "some string {n}")
+(shell-literal echo value{n})
+(let tmpl{n} `(a ,value{n} ,@(b c) 'd))
+"""
+
+
+def sample_program(size: int) -> str:
+    """
+    Generates a Shisp program of (roughly) size bytes.
+    """
+    forms = []
+    total = 0
+    n = 0
+    while total < size:
+        form = SAMPLE_FORMS.format(n=n)
+        forms.append(form)
+        total += len(form)
+        n += 1
+    return ''.join(forms)
+
+
+def best_time(func: Callable, *args, repeat: int = 3) -> float:
+    """
+    Returns the best wall time (in seconds) out of repeat runs of func.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(func: Callable, *args) -> tuple[int, Any]:
+    """
+    Runs func once under tracemalloc.
+
+    Returns the peak traced memory (in bytes) and what func returned.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, result
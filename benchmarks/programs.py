@@ -0,0 +1,66 @@
+"""
+Generators for synthetic Shisp programs, for the benchmark suite.
+
+Each generator takes a size n and returns the program's source. What n
+counts depends on the program, see PROGRAMS.
+"""
+
+from typing import Callable
+
+
+def many_lets(n: int) -> str:
+    """ n top-level lets, each using the one before it. """
+    lines = ['(let v0 0)']
+    for i in range(1, n):
+        lines.append('(let v{} v{})'.format(i, i - 1))
+    return '\n'.join(lines) + '\n'
+
+
+def deep_nesting(n: int) -> str:
+    """ A call inside n Exprs. """
+    return '(let x 1)\n(defun foo (a) a)\n{}foo x{}\n'.format('(' * n, ')' * n)
+
+
+def wide_quote(n: int) -> str:
+    """ Ten quoted lists of n elements each, of symbols, numbers and strings. """
+    items = []
+    for i in range(n):
+        match i % 3:
+            case 0:
+                items.append('a{}'.format(i))
+            case 1:
+                items.append(str(i))
+            case 2:
+                items.append('"s{}"'.format(i))
+    lines = ["'(q{} {})".format(i, ' '.join(items)) for i in range(10)]
+    return '\n'.join(lines) + '\n'
+
+
+def long_functions(n: int) -> str:
+    """ n defuns and depuns, each with n // 4 + 1 arguments, and calls to them. """
+    args = ['a{}'.format(i) for i in range(n // 4 + 1)]
+    arglist = ' '.join(args)
+    lines = []
+    for i in range(n):
+        lines.append('(defun f{} ({}) {})'.format(i, arglist, args[-1]))
+        lines.append("(depun g{} ({}) '{})".format(i, arglist, args[0]))
+        lines.append('(f{} {})'.format(i, ' '.join(str(j) for j in range(len(args)))))
+    return '\n'.join(lines) + '\n'
+
+
+def quasiquotes(n: int) -> str:
+    """ n quasiquoted lists full of unquote and unquote-splice. """
+    lines = ['(let v 1)']
+    for i in range(n):
+        lines.append("`(t{} ,v ,@(b c) 'd (e ,v (f ,@(g h) ,v)) \"s{}\")".format(i, i))
+    return '\n'.join(lines) + '\n'
+
+
+# name: (generator, default n)
+PROGRAMS: dict[str, tuple[Callable[[int], str], int]] = {
+    'lets': (many_lets, 5000),
+    'nesting': (deep_nesting, 5000),
+    'wide-quote': (wide_quote, 5000),
+    'functions': (long_functions, 400),
+    'quasiquote': (quasiquotes, 2000),
+}
@@ -0,0 +1,188 @@
+"""
+The benchmark suite for the bootstrap compiler.
+
+Compiles the synthetic programs from programs.py, timing each stage of
+the compiler, and writes the statistics as JSON. Two such files can be
+compared, to flag the stages that got slower.
+
+Usage:
+    python3 benchmarks/suite.py run [-o results.json] [--repeat N] [--scale F] [program...]
+    python3 benchmarks/suite.py compare old.json new.json [--threshold PERCENT]
+
+compare exits with status 1 if it found a regression, so it can fail a
+CI job.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+
+from common import BOOTSTRAP
+from programs import PROGRAMS
+
+import lexer.tokens
+import compiler.compiler
+import state
+
+from api import read_ast, front_end_passes, run_passes
+from timings import Timings
+
+
+# The stages timed, in the order they run, as --timings names them.
+# functions shares the varrefs walk, so it is timed as part of it.
+STAGES = ('lex', 'parse', 'metamacros', 'varrefs', 'codegen', 'total')
+
+# Bump this when the JSON output changes shape.
+FORMAT = 1
+
+
+def time_stages(text: str) -> dict[str, float]:
+    """
+    Compiles text once, as main.py does, returning the seconds each
+    stage took as Timings measured them (without tracing memory).
+    """
+    _state = state.GlobalState(['bench'], {}, {}, [], 'bench')
+    timings = Timings('bench', enabled=True, memory=False)
+
+    with timings.stage('lex'):
+        tokens = lexer.tokens.scan(text)
+    ast = read_ast(tokens, _state, timings)
+    ast = run_passes(ast, front_end_passes(), timings)
+    with timings.stage('codegen'):
+        compiler.compiler.compile(ast)
+
+    times = {stage: timings.stages[stage].seconds for stage in STAGES[:-1]}
+    times['total'] = sum(times.values())
+    return times
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def bench(text: str, repeat: int, warmup: int) -> dict[str, dict[str, float]]:
+    """
+    Times the stages over repeat compiles of text, after warmup ones
+    that aren't counted. The collector is run before, and disabled
+    during, each compile so it doesn't land in one stage at random.
+    """
+    samples = {stage: [] for stage in STAGES}
+    for run in range(warmup + repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            times = time_stages(text)
+        finally:
+            gc.enable()
+        if run >= warmup:
+            for stage in STAGES:
+                samples[stage].append(times[stage])
+    return {stage: summarize(samples[stage]) for stage in STAGES}
+
+
+def run(args: argparse.Namespace) -> int:
+    names = args.programs or list(PROGRAMS)
+    for name in names:
+        if name not in PROGRAMS:
+            print('unknown program {}, known are: {}'.format(name, ', '.join(PROGRAMS)))
+            return 2
+
+    results = {}
+    for name in names:
+        generate, size = PROGRAMS[name]
+        size = max(1, int(size * args.scale))
+        text = generate(size)
+        stages = bench(text, args.repeat, args.warmup)
+        results[name] = {'size': size, 'bytes': len(text), 'stages': stages}
+        print('{:<12} n={:<6} {:>9.4f} s median'.format(name, size, stages['total']['median']),
+              file=sys.stderr)
+
+    output = json.dumps({'format': FORMAT,
+                         'python': platform.python_version(),
+                         'repeat': args.repeat,
+                         'warmup': args.warmup,
+                         'programs': results},
+                        indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    """
+    Compares the median of each stage of each program in both runs.
+
+    A stage regressed if its median grew by more than threshold percent,
+    and by more than floor seconds, which keeps stages that take almost
+    no time from being flagged for noise.
+    """
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if old['format'] != new['format']:
+        print('the results have different formats ({} and {})'.format(old['format'], new['format']))
+        return 2
+
+    regressions = 0
+    print('{:<12}{:<12}{:>12}{:>12}{:>9}'.format('program', 'stage', 'old', 'new', 'change'))
+    for name, old_program in old['programs'].items():
+        new_program = new['programs'].get(name)
+        if new_program is None:
+            continue
+        if old_program['size'] != new_program['size']:
+            print('{:<12}skipped, sizes differ ({} and {})'.format(
+                name, old_program['size'], new_program['size']))
+            continue
+        for stage in STAGES:
+            before = old_program['stages'][stage]['median']
+            after = new_program['stages'][stage]['median']
+            change = (after - before) / before * 100 if before else 0.0
+            regressed = change > args.threshold and after - before > args.floor
+            regressions += regressed
+            print('{:<12}{:<12}{:>12.6f}{:>12.6f}{:>+8.1f}%{}'.format(
+                name, stage, before, after, change, '  REGRESSION' if regressed else ''))
+
+    print('{} regression(s) over {}%'.format(regressions, args.threshold))
+    return 1 if regressions else 0
+
+
+def main(argv: list[str]) -> int:
+    arguments = argparse.ArgumentParser(description='Benchmarks the bootstrap compiler ({}).'.format(BOOTSTRAP))
+    commands = arguments.add_subparsers(dest='command', required=True)
+
+    run_command = commands.add_parser('run', help='run the benchmarks')
+    run_command.add_argument('programs', nargs='*',
+                             help='programs to run, out of: {}'.format(', '.join(PROGRAMS)))
+    run_command.add_argument('-o', '--output', help='write the results here instead of stdout')
+    run_command.add_argument('--repeat', type=int, default=7, help='timed compiles of each program')
+    run_command.add_argument('--warmup', type=int, default=1, help='untimed compiles first')
+    run_command.add_argument('--scale', type=float, default=1.0, help='multiplies each program size')
+    run_command.set_defaults(func=run)
+
+    compare_command = commands.add_parser('compare', help='compare two results')
+    compare_command.add_argument('old')
+    compare_command.add_argument('new')
+    compare_command.add_argument('--threshold', type=float, default=10.0,
+                                 help='percent a median may grow by (default 10)')
+    compare_command.add_argument('--floor', type=float, default=0.001,
+                                 help='seconds a median must grow by to count (default 0.001)')
+    compare_command.set_defaults(func=compare)
+
+    args = arguments.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,130 @@
+"""
+The in-process compile API.
+
+compile_source compiles a program held in memory, for tools that
+compile many programs in one process (test generators, editors,
+fuzzers) without the cost of a subprocess or of files. The pieces of
+the pipeline it is made of are also used by main.py.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+import lexer.tokens
+import parser
+import compiler.compiler
+import prelude
+import state
+
+from errors import AbortParse, ShispError, ShispWarn
+from interfaces import loader_for
+from shisp_ast.ast import AST
+from shisp_ast.data_nodes import Variable
+from timings import Timings
+
+
+@dataclass
+class CompileResult:
+    """
+    What compile_source made of a program.
+
+    output is the shell script, or None if there were errors.
+    """
+    output: Optional[str]
+    errors: list[ShispError] = field(default_factory=list)
+    warnings: list[ShispWarn] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.output is not None
+
+
+def compile_source(text: str | bytes, *, filename: str = '<source>',
+                   options: Iterable[str] = ()) -> CompileResult:
+    """
+    Compiles the program in text.
+
+    filename is only used in diagnostics. options are main.py's options
+    without the --, only 'multipass', 'import-path=DIR' and the prelude
+    and cache options change anything here. Imports are only looked for
+    in the import paths.
+
+    Nothing is kept between calls but the prelude's snapshot (see
+    prelude), and that is only read: each compile has its own
+    GlobalState (and so symbol table), and the builtins are shared
+    read-only. So this can be called from several threads at once.
+
+    Raises SyntaxError for what the passes after the reader find wrong
+    (like an undefined variable), which aren't ShispErrors yet.
+    """
+    _state = state.GlobalState([filename], {}, {}, list(options), filename)
+    try:
+        snapshot = prelude.load_prelude(_state)
+        ast = read_ast(lexer.tokens.scan(text), _state)
+    except AbortParse:
+        # Errors in the prelude are listed under its file name
+        return CompileResult(None, [error for found in _state.errors.values() for error in found],
+                             _state.warnings.get(filename, []))
+    preloaded, preamble = ((), '') if snapshot is None else (snapshot.variables, snapshot.script)
+    ast = front_end_passes(loader_for(_state.options), preloaded).run(ast)
+    return CompileResult(compiler.compiler.compile(ast, preamble=preamble), [],
+                         _state.warnings.get(filename, []))
+
+
+def read_ast(tokens: lexer.tokens.TokenStore, _state: state.GlobalState,
+             timings: Optional[Timings] = None) -> AST:
+    """
+    Builds the simplified AST for the lexemes.
+
+    This is done in one pass by parser.reader, unless the 'multipass'
+    option is set. Then the older parse, desugar and squash passes
+    are used, which is useful for checking the reader against them.
+    """
+    timings = timings or Timings(_state.current_file)
+    if 'multipass' in _state.options:
+        with timings.stage('parse'):
+            ast = parser.parse_tokens.parse_lexemes(tokens, _state)
+        timings.counted('parse', ast)
+        with timings.stage('desugar'):
+            ast = parser.desugar_source.combine_ast(ast)
+        timings.counted('desugar', ast)
+        with timings.stage('squash'):
+            ast = parser.simplify_ast.squash_ast(ast, _state.symbols)
+        return timings.counted('squash', ast)
+
+    with timings.stage('parse'):
+        ast = parser.reader.read(tokens, _state)
+    timings.fuse('desugar', 'parse')
+    timings.fuse('squash', 'parse')
+    return timings.counted('parse', ast)
+
+
+def front_end_passes(load_interface: Optional[Callable[[str], Iterable[Variable]]] = None,
+                     preloaded: Iterable[Variable] = ()) -> parser.pass_manager.PassManager:
+    """
+    The passes run on the AST before it is compiled.
+
+    load_interface is what import loads modules with, and preloaded the
+    variables the global scope starts with, see
+    parser.expand_metamacros.metamacro_pass.
+    """
+    return parser.pass_manager.PassManager([
+        parser.expand_metamacros.metamacro_pass(load_interface, preloaded),
+        parser.handle_varrefs.variable_pass(),
+        parser.handle_functions.function_pass(),
+    ])
+
+
+def run_passes(ast: AST, passes: parser.pass_manager.PassManager,
+               timings: Timings) -> AST:
+    """
+    Runs the passes, timing each walk as the stage of its first pass.
+    """
+    for group in passes.groups():
+        name = group[0].name
+        with timings.stage(name):
+            passes.run_group(ast, group)
+        timings.counted(name, ast)
+        for _pass in group[1:]:
+            timings.fuse(_pass.name, name)
+    return ast
@@ -0,0 +1,150 @@
+"""
+An on-disk cache of compiled scripts, for the --cache option.
+
+Each compiled script is stored under a key that hashes the source, the
+compiler (its own source files, as there is no version number to go
+by), the prelude (see prelude) and the options that change the
+output. A file that hasn't changed since it was last compiled with the
+same compiler, prelude and options is then copied from the cache
+instead of being compiled again.
+
+An entry also records the interface files (see interfaces) the compile
+imported and a digest of each, and is only used while they are the
+same, as the script depends on what they export.
+
+Nothing is ever removed from the cache, delete the directory to clear
+it.
+"""
+
+import hashlib
+import json
+import os
+
+from dataclasses import dataclass
+from functools import cache
+from os.path import basename, splitext
+from pathlib import Path
+from shutil import copyfileobj
+from tempfile import NamedTemporaryFile
+from typing import Iterable, Optional
+
+
+# Where the compiler's source is, for compiler_version.
+BOOTSTRAP = Path(__file__).resolve().parent
+
+# Options that don't change what is compiled. Those taking a value are
+# matched by their name.
+REPORT_OPTIONS = ('timings', 'timings=json', 'pass-stats', 'profile', 'cache')
+
+
+@cache
+def compiler_version() -> str:
+    """ Hashes the compiler's own source. """
+    digest = hashlib.sha256()
+    for path in sorted(BOOTSTRAP.rglob('*.py')):
+        digest.update(str(path.relative_to(BOOTSTRAP)).encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def output_options(options: list[str]) -> list[str]:
+    """ The options that change the output, sorted. """
+    return sorted({option for option in options
+                   if option not in REPORT_OPTIONS
+                   and option.split('=', 1)[0] not in REPORT_OPTIONS})
+
+
+def default_directory() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'shisp')
+
+
+def file_digest(file_name: str) -> str:
+    with open(file_name, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def prelude_parts(prelude: Optional[str]) -> tuple[str, str]:
+    """ The absolute path and digest of the prelude file, for keys. """
+    if prelude is None:
+        return ('no-prelude', '')
+    return (os.path.abspath(prelude), file_digest(prelude))
+
+
+@dataclass
+class BuildCache:
+    """
+    The cache in directory. Entries are kept as
+    directory/<first two characters of key>/<key><suffix>, one file for
+    each output (.sh for the script, .shispi for the interface) and a
+    .json manifest listing them and what the compile depended on.
+    """
+    directory: str
+
+    @classmethod
+    def from_options(cls, options: list[str]) -> Optional["BuildCache"]:
+        """
+        The cache that --cache or --cache=DIR ask for, if either was given.
+        """
+        for option in options:
+            if option == 'cache':
+                return cls(default_directory())
+            if option.startswith('cache='):
+                return cls(option[len('cache='):])
+        return None
+
+    def key(self, file_name: str, options: list[str], prelude: Optional[str] = None) -> str:
+        """
+        The key for compiling file_name with options, and the prelude
+        file (if there is one) they resolve to. With --interface the
+        module's name is in the key too, as the interface holds it.
+        """
+        module = splitext(basename(file_name))[0] if 'interface' in options else ''
+        digest = hashlib.sha256()
+        for part in (file_digest(file_name), compiler_version(), *prelude_parts(prelude),
+                     module, *output_options(options)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path(self, key: str, suffix: str = '.sh') -> str:
+        return os.path.join(self.directory, key[:2], '{}{}'.format(key, suffix))
+
+    def fetch(self, key: str) -> Optional[dict[str, str]]:
+        """
+        Returns the paths of the cached outputs for key by suffix, if
+        there is an entry and the files it depended on haven't changed.
+        """
+        try:
+            with open(self.path(key, '.json')) as f:
+                manifest = json.load(f)
+            prelude = manifest['prelude'] or {}
+            for dependency, digest in [*prelude.items(), *manifest['depends'].items()]:
+                if file_digest(dependency) != digest:
+                    return None
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        return {suffix: self.path(key, suffix) for suffix in manifest['outputs']}
+
+    def store(self, key: str, outputs: dict[str, str], depends: Iterable[str] = (),
+              prelude: Optional[str] = None):
+        """
+        Copies the output files (by suffix) into the cache as key, noting
+        the prelude and the files in depends. Each is written to a
+        temporary file first, and the manifest last, so compiles running
+        at the same time never see half of an entry.
+        """
+        directory = os.path.dirname(self.path(key))
+        os.makedirs(directory, exist_ok=True)
+        for suffix, output_file in outputs.items():
+            with open(output_file, 'rb') as output, \
+                 NamedTemporaryFile('wb', dir=directory, delete=False) as entry:
+                copyfileobj(output, entry)
+            os.replace(entry.name, self.path(key, suffix))
+
+        manifest = {'outputs': list(outputs),
+                    'prelude': None if prelude is None else dict([prelude_parts(prelude)]),
+                    'depends': {os.path.abspath(d): file_digest(d) for d in depends}}
+        with NamedTemporaryFile('w', dir=directory, delete=False) as entry:
+            json.dump(manifest, entry)
+        os.replace(entry.name, self.path(key, '.json'))
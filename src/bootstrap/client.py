@@ -0,0 +1,51 @@
+"""
+The client for server.py, used in place of main.py.
+
+It takes the same arguments as main.py, has the server run them and
+prints what they printed. If no server is running, it runs main.py's
+command line itself, so it works either way, only slower.
+
+The socket is $SHISP_SOCKET if that is set, otherwise where server.py
+puts it by default.
+"""
+
+import json
+import os
+import socket
+import sys
+
+
+def socket_path() -> str:
+    if path := os.environ.get('SHISP_SOCKET'):
+        return path
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'shisp.sock')
+    return '/tmp/shisp-{}.sock'.format(os.getuid())
+
+
+def request(path: str, arguments: list[str]) -> dict:
+    """ Sends a command line to the server at path, returns the reply. """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        message = {'argv': arguments, 'cwd': os.getcwd()}
+        connection.sendall(json.dumps(message).encode('utf-8'))
+        # The end of the request
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile('rb') as replies:
+            return json.loads(replies.readline())
+
+
+def run(arguments: list[str]) -> int:
+    try:
+        reply = request(socket_path(), arguments)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # Only imported now, the point of the server is not doing this
+        import main
+        return main.main(arguments)
+    sys.stdout.write(reply['output'])
+    return reply['status']
+
+
+if __name__ == '__main__':
+    sys.exit(run(sys.argv[1:]))
@@ -4,8 +4,9 @@ Compiler
 
 from functools import reduce
 from operator import or_
+from typing import Any, Callable, Generator, Optional
 
-import macro
+import macros
 
 class Boilerplate:
     """
@@ -18,18 +19,46 @@ class Boilerplate:
     ifs='unset IFS\nIFS=" "'
 
     def __str__(self):
-        output = ''
-        for attr in dir(self.__class__):
-            if "__" in attr:
-                continue
-            output = '{}{}\n'.format(output, getattr(self, attr))
-        return output
+        return ''.join('{}\n'.format(getattr(self, attr))
+                       for attr in dir(self.__class__) if "__" not in attr)
 
 
-from shisp_ast import AST, Node, Expr, Number, String, VariableRef, MacroCall, Comment, FunctionCall, ReturnNode, Symbol
+from shisp_ast.ast import AST, Node, Expr, Number, String, VariableRef, MacroCall, Comment, FunctionCall, ReturnNode, Symbol
 
 
-def compile_return(node: ReturnNode) -> str:
+# The compile_* functions (other than compile) are generators. When one
+# needs something else compiled first, it yields the Compilation for
+# that, and run sends back the result. This keeps the nesting of the
+# program on run's stack instead of Python's.
+Compilation = Generator[Any, Any, Any]
+
+
+# Returned by compile_child for a node that doesn't compile to anything
+# on its own, like an unquote outside of a quasiquote.
+NOTHING = object()
+
+
+def run(compilation: Compilation) -> Any:
+    """
+    Runs a Compilation, and everything it yields, to the end.
+
+    Returns what the Compilation returned.
+    """
+    stack = [compilation]
+    result = None
+    while stack:
+        try:
+            request = stack[-1].send(result)
+        except StopIteration as done:
+            stack.pop()
+            result = done.value
+        else:
+            stack.append(request)
+            result = None
+    return result
+
+
+def compile_return(node: ReturnNode) -> Compilation:
     actual = node.children[0]
     if node.parent.parent.macro_name == "defun":
         # IF we are defun
@@ -38,61 +67,60 @@ def compile_return(node: ReturnNode) -> str:
             case Number(_) | String(_) | VariableRef(_):
                 return ('__{}_RVAL={}'
                 ).format(fname,
-                         compile_node(actual))
+                         (yield compile_node(actual)))
             case FunctionCall(_):
                 return ('{}'
                  '__{}_RVAL="${{__{}_RVAL}}"'
-                ).format(compile_node(actual),
+                ).format((yield compile_node(actual)),
                          fname,
                          actual.data.name)
             case Expr(_):
-                return '{} | read __{}_RVAL'.format(compile_expr(actual), fname)
+                return '{} | read __{}_RVAL'.format((yield compile_expr(actual)), fname)
     elif node.parent.parent.macro_name == 'depun':
         # IF we are depun
         fname = node.parent.parent.children[0].escape_data()
         match actual:
             case Number(_) | String(_):
                 return ("printf -- {}'\\n'"
-                       ).format(compile_node(actual))
+                       ).format((yield compile_node(actual)))
             case VariableRef(_):
                 return ("printf -- {}'\\n'"
-                       ).format(compile_node(actual))
+                       ).format((yield compile_node(actual)))
             case FunctionCall(_):
                 if actual.pure:
                     return ("printf -- $({})'\\n'"
-                           ).format(compile_node(actual))
+                           ).format((yield compile_node(actual)))
                 else:
                     return ('{}'
                             "printf -- ${{__{}_RVAL}}'\\n'"
-                           ).format(compile_node(actual),
+                           ).format((yield compile_node(actual)),
                                     actual.data.name)
             case Expr(_):
-                return ("printf -- $({})'\\n'").format(compile_expr(actual))
+                return ("printf -- $({})'\\n'").format((yield compile_expr(actual)))
 
 def compile_demac(node: MacroCall) -> str:
-    pass
+    """
+    Macros are expanded before the code is compiled, so nothing is left
+    of their definitions in the script.
+    """
+    return ''
 
 
-def compile_depun(node: MacroCall) -> str:
+def compile_depun(node: MacroCall) -> Compilation:
     name = node.children[0].escape_data()
     args = node.args
-    body = compile_children(node.body[0])
+    body = yield compile_children(node.body[0])
 
     definition = '\n{}() (\n'.format(name)
     body = ['\t{}'.format(l) for l in body]
 
-    compiled_args = ""
-    arg_cleanup = "\n\tunset "
+    compiled_args = ''
+    arg_cleanup = '\n\tunset '
     if args:
-        for index, arg in enumerate(args.children, 1):
-            compiled_args = ('{}\t{}="${}"\n'
-                            ).format(compiled_args,
-                                     arg.data,
-                                     index)
-
-        for arg in args.children:
-            arg_cleanup = '{}{} '.format(arg_cleanup,
-                                         arg.data)
+        compiled_args = ''.join('\t{}="${}"\n'.format(arg.data, index)
+                                for index, arg in enumerate(args.children, 1))
+        arg_cleanup = '{}{}'.format(arg_cleanup,
+                                    ''.join('{} '.format(arg.data) for arg in args.children))
 
     return '{}{}\n{}{}\n)\n'.format(definition,
                                    compiled_args,
@@ -101,33 +129,28 @@ def compile_depun(node: MacroCall) -> str:
 
 
 
-def compile_defun(node: MacroCall) -> str:
+def compile_defun(node: MacroCall) -> Compilation:
     name = node.children[0].data
     args = node.args
-    body = compile_children(node.body[0])
+    body = yield compile_children(node.body[0])
 
     definition = '\n{}() {{\n'.format(name)
     body = ['\t{}'.format(l) for l in body]
 
-    compiled_args = ""
-    arg_cleanup = "\n\tunset "
+    compiled_args = ''
+    arg_cleanup = '\n\tunset '
     if args:
-        for index, arg in enumerate(args.children, 1):
-            compiled_args = ('{}\t{}="${}"\n'
-                            ).format(compiled_args,
-                                     arg.data,
-                                     index)
-
-        for arg in args.children:
-            arg_cleanup = '{}{} '.format(arg_cleanup,
-                                         arg.data)
+        compiled_args = ''.join('\t{}="${}"\n'.format(arg.data, index)
+                                for index, arg in enumerate(args.children, 1))
+        arg_cleanup = '{}{}'.format(arg_cleanup,
+                                    ''.join('{} '.format(arg.data) for arg in args.children))
 
     return '{}{}\n{}{}\n}}\n'.format(definition,
                                    compiled_args,
                                    ''.join(body),
                                    arg_cleanup)
 
-def compile_node(node: Node, escaped=True) -> str:
+def compile_node(node: Node, escaped=True) -> Compilation:
     match node:
         case Comment(_):
             return ''
@@ -140,9 +163,9 @@ def compile_node(node: Node, escaped=True) -> str:
         case VariableRef(_):
             return '${{{}}}'.format(node.data.name)
         case Expr(_):
-            return compile_expr(node)
+            return (yield compile_expr(node))
         case ReturnNode(_):
-            return compile_return(node)
+            return (yield compile_return(node))
         case Symbol(_) if escaped == True:
             return node.escape_data()
         case Symbol(_):
@@ -151,47 +174,47 @@ def compile_node(node: Node, escaped=True) -> str:
     raise SyntaxError("Unknown Node!")
 
 
-def compile_expr(node: Expr) -> str:
+def compile_expr(node: Expr) -> Compilation:
     has_expr = reduce(or_, [isinstance(c, Expr) for c in node.children])
     has_fcal = reduce(or_, [isinstance(c, FunctionCall) for c in node.children])
     has_mmcal = reduce(or_, [isinstance(c, MacroCall) for c in node.children])
 
     if has_expr or has_fcal or has_mcal:
-        return ' '.join(compile_children(node))
+        return ' '.join((yield compile_children(node)))
     elif len(node.children) == 0:
         return '"nil"'
     else:
-        return ' '.join(compile_children(node))
+        return ' '.join((yield compile_children(node)))
 
-def compile_quote(body: list[Node]) -> str:
-    def _compile_node(node: Node) -> str:
+def compile_quote(body: list[Node]) -> Compilation:
+    def _compile_node(node: Node) -> Compilation:
         match node:
             case Expr(_):
                 output = []
                 for child in node.children:
-                    output.append(_compile_node(child))
+                    output.append((yield _compile_node(child)))
                 return '({})'.format(' '.join(output))
             case Node(_):
                 return node.data
         raise SyntaxError
     output = []
     for node in body:
-        output.append(_compile_node(node))
+        output.append((yield _compile_node(node)))
     return "'{}'".format(' '.join(output))
 
-def compile_quasiquote(body: list[Node]) -> str:
-    def _compile_node(node: Node) -> str:
+def compile_quasiquote(body: list[Node]) -> Compilation:
+    def _compile_node(node: Node) -> Compilation:
         match node:
             case Expr(_):
                 output = []
                 for child in node.children:
-                    output.append(_compile_node(child))
+                    output.append((yield _compile_node(child)))
                 return '({})'.format(' '.join(output))
             case MacroCall(macro_name='unquote'):
-                response = compile_node(node.body)
+                response = yield compile_node(node.body)
                 return '"{}"'.format(response)
             case MacroCall(macro_name='unquote-splice'):
-                response = compile_node(node.body)
+                response = yield compile_node(node.body)
                 if response[0] == '(' and response[-1] == ')':
                     response = response[1:-1]
                 return '"{}"'.format(response)
@@ -201,50 +224,109 @@ def compile_quasiquote(body: list[Node]) -> str:
         raise SyntaxError
     output = []
     for node in body:
-        output.append(_compile_node(node))
+        output.append((yield _compile_node(node)))
     return '"{}"'.format(' '.join(output))
 
 
-def compile_children(node: Node) -> list[str]:
+def compile_children(node: Node) -> Compilation:
     output = []
     for child in node.children:
-        match child:
-            case MacroCall(macro_name='quasiquote'):
-                output.append(compile_quasiquote(child.body))
-            case MacroCall(macro_name='quote'):
-                output.append(compile_quote(child.body))
-            case MacroCall(macro_name='shell-literal'):
-                output.append(' '.join([compile_node(c, False) for c in child.body]))
-            case MacroCall(macro_name='let'):
-                match child.body[0]:
-                    case FunctionCall(_):
-                        if not child.body[0].is_pure:
-                            asmnt = ('{{value}}\n'
-                                     '{{name}}="${{{{__{}_RVAL}}}}"\n'
-                                    ).format(child.body[0].data.name)
-                        else:
-                            asmnt = ('{name}=$({value})\n')
-                    case Node(_):
-                        asmnt = '{name}={value}\n'
-                asmnt = asmnt.format(name=child.args.data,
-                                     value=compile_node(child.body[0]))
-                output.append(asmnt)
-            case MacroCall(macro_name='defun'):
-                output.append(compile_defun(child))
-            case MacroCall(macro_name='depun'):
-                output.append(compile_depun(child))
-            case MacroCall(macro_name='demac'):
-                output.append(compile_demac(child))
-            case Expr(_):
-                output.append('{}\n'.format(compile_expr(child)))
-            case Node(_):
-                output.append(compile_node(child))
+        if (compiled := (yield compile_child(child))) is not NOTHING:
+            output.append(compiled)
     return output
 
 
-def compile(ast: AST) -> str:
+def compile_child(child: Node) -> Compilation:
+    """
+    Compiles a node as a child of an Expr, or of the root.
+
+    Returns NOTHING for nodes that don't compile to anything on their own.
+    """
+    match child:
+        case MacroCall(macro_name='quasiquote'):
+            return (yield compile_quasiquote(child.body))
+        case MacroCall(macro_name='quote'):
+            return (yield compile_quote(child.body))
+        case MacroCall(macro_name='shell-literal'):
+            literals = []
+            for literal in child.body:
+                literals.append((yield compile_node(literal, False)))
+            return ' '.join(literals)
+        case MacroCall(macro_name='let'):
+            match child.body[0]:
+                case FunctionCall(_):
+                    if not child.body[0].is_pure:
+                        asmnt = ('{{value}}\n'
+                                 '{{name}}="${{{{__{}_RVAL}}}}"\n'
+                                ).format(child.body[0].data.name)
+                    else:
+                        asmnt = ('{name}=$({value})\n')
+                case Node(_):
+                    asmnt = '{name}={value}\n'
+            return asmnt.format(name=child.args.data,
+                                value=(yield compile_node(child.body[0])))
+        case MacroCall(macro_name='defun'):
+            return (yield compile_defun(child))
+        case MacroCall(macro_name='depun'):
+            return (yield compile_depun(child))
+        case MacroCall(macro_name='demac'):
+            return compile_demac(child)
+        case MacroCall(macro_name='import'):
+            # The module's script is looked for on $PATH
+            return '. {}.sh\n'.format(child.args.data)
+        case Expr(_):
+            return '{}\n'.format((yield compile_expr(child)))
+        case Node(_):
+            return (yield compile_node(child))
+    return NOTHING
+
+
+def emit(ast: AST, write: Callable[[str], Any],
+         top_level: Optional[Callable[[Node], None]] = None, preamble: str = ''):
+    """
+    Compiles the AST to POSIX Shell, handing the output to write a piece
+    at a time: the boilerplate, then each top-level form as soon as it
+    is compiled.
+
+    top_level, if given, is called with each top-level node before it
+    is compiled. preamble is written right after the boilerplate (it is
+    the prelude's script, see prelude).
+    """
+    emit_header(write, preamble)
+    emit_forms(ast, write, top_level)
+    emit_footer(write)
+
+
+def emit_header(write: Callable[[str], Any], preamble: str = ''):
+    write('{}\n'.format(Boilerplate()))
+    if preamble:
+        write(preamble)
+
+
+def emit_forms(ast: AST, write: Callable[[str], Any],
+               top_level: Optional[Callable[[Node], None]] = None):
+    """
+    Compiles the top-level forms in the AST, without the header and
+    footer. See emit.
+    """
+    for child in ast.base_node.children:
+        if top_level is not None:
+            top_level(child)
+        if (compiled := run(compile_child(child))) is not NOTHING:
+            write(compiled)
+
+
+def emit_footer(write: Callable[[str], Any]):
+    write('\n')
+
+
+def compile(ast: AST, top_level: Optional[Callable[[Node], None]] = None,
+            preamble: str = '') -> str:
     """
     Compiles the AST to POSIX Shell
+
+    top_level and preamble are as for emit.
     """
-    return '{}\n{}\n'.format(Boilerplate(),
-                           ''.join(compile_children(ast.base_node)))
+    output = []
+    emit(ast, output.append, top_level, preamble)
+    return ''.join(output)
@@ -0,0 +1,189 @@
+"""
+Interface files, for the import metamacro.
+
+Compiling a module with --interface writes, next to its script, a
+<module>.shispi file holding what the module exports: the names in its
+global scope and what kind of thing each is (variable, function, pure
+function or macro), with the arguments of functions and the source of
+macros. A program that does (import module) then loads that file
+instead of the module's source, which is only as much work as the module
+has exports.
+
+The file is JSON, and names the compiler that wrote it. Interfaces
+written by a different compiler (see build_cache.compiler_version) are
+refused, as the module has to be compiled again to match it.
+"""
+
+import json
+import os
+
+from dataclasses import dataclass, field
+from os.path import dirname, join
+from tempfile import NamedTemporaryFile
+from typing import Iterator, Optional
+
+import lexer.tokens
+import parser
+import state
+
+from build_cache import compiler_version
+from shisp_ast.ast import AST, Expr, Symbol, NO_CHILDREN
+from shisp_ast.data_nodes import Scope, Variable, Function, PureFunction, Macro, Imported
+
+
+# Bump this when the JSON changes shape.
+FORMAT = 1
+
+SUFFIX = '.shispi'
+
+
+def kind(variable: Variable) -> str:
+    match variable.value:
+        case Macro(_):
+            return 'macro'
+        case PureFunction(_):
+            return 'pure-function'
+        case Function(_):
+            return 'function'
+    return 'variable'
+
+
+def exports(ast: AST, source: bytes) -> Iterator[dict]:
+    """
+    What the module in ast exports: everything in its global scope but
+    what it imported itself. source is what ast was read from.
+    """
+    for variable in ast.base_node.scope.variables.values():
+        if isinstance(variable, Imported):
+            continue
+        export = {'name': variable.name, 'kind': kind(variable)}
+        if isinstance(variable.value, Function):
+            args = [arg.data for arg in variable.value.args.children]
+            export['arity'] = len(args)
+            export['args'] = args
+        if isinstance(variable.value, Macro):
+            # The whole demac form, the body's parent
+            start = variable.value.body.parent.start
+            export['source'] = bytes(source[start:form_end(source, start)]).decode('utf-8')
+        yield export
+
+
+def form_end(source: bytes, start: int) -> int:
+    """
+    Returns the offset just after the form that opens at start. Nodes
+    only know where they start, so this lexes to its closing paren.
+    """
+    depth = 0
+    for match in lexer.tokens.LEXEME.finditer(source, start):
+        match match.lastgroup:
+            case 'OPEN':
+                depth += 1
+            case 'CLOSE':
+                depth -= 1
+                if depth == 0:
+                    return match.end()
+    return len(source)
+
+
+def write_interface(file_name: str, module: str, ast: AST, source: bytes):
+    """
+    Writes the interface of the module in ast to file_name. It is written
+    to a temporary file first, so an import never sees half of one.
+    """
+    interface = {'format': FORMAT,
+                 'compiler': compiler_version(),
+                 'module': module,
+                 'exports': list(exports(ast, source))}
+    with NamedTemporaryFile('w', dir=dirname(os.path.abspath(file_name)),
+                            prefix='.shisp-', delete=False) as f:
+        json.dump(interface, f, indent=1)
+    os.replace(f.name, file_name)
+
+
+def read_interface(file_name: str) -> list[Imported]:
+    """
+    Reads the exports in an interface file.
+
+    Raises SyntaxError if the file was written by another compiler.
+    """
+    with open(file_name, encoding='utf-8') as f:
+        interface = json.load(f)
+    if interface.get('format') != FORMAT or interface.get('compiler') != compiler_version():
+        raise SyntaxError(("{} was written by another compiler!\n"
+                           "Compile {} again with --interface."
+                          ).format(file_name, interface.get('module', 'it')))
+
+    module = interface['module']
+    imported = []
+    for export in interface['exports']:
+        match export['kind']:
+            case 'macro':
+                value = read_macro(export['source'], file_name)
+            case 'function':
+                value = Function(Scope(), None, arglist(export['args']))
+            case 'pure-function':
+                value = PureFunction(Scope(), None, arglist(export['args']))
+            case _:
+                value = None
+        imported.append(Imported(export['name'], value, module))
+    return imported
+
+
+def arglist(names: list[str]) -> Expr:
+    args = Expr(0, 0, [Symbol(0, 0, NO_CHILDREN, None, data=name) for name in names], None)
+    for arg in args.children:
+        arg.parent = args
+    return args
+
+
+def read_macro(text: str, file_name: str) -> Macro:
+    """ Defines the macro again from its demac form. """
+    _state = state.GlobalState([file_name], {}, {}, [], file_name)
+    ast = parser.reader.read(lexer.tokens.scan(text), _state)
+    parser.expand_metamacros.resolve_metamacros(ast)
+    (variable,) = ast.base_node.scope.variables.values()
+    return variable.value
+
+
+@dataclass
+class InterfaceLoader:
+    """
+    Finds and reads the interfaces of the modules a program imports.
+
+    A module's interface is looked for in each directory of search_path
+    in turn. loaded maps the path of each interface read to its module.
+    """
+    search_path: list[str]
+    loaded: dict[str, str] = field(default_factory=dict)
+
+    def find(self, module: str) -> Optional[str]:
+        for directory in self.search_path:
+            path = join(directory, module + SUFFIX)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def __call__(self, module: str) -> list[Imported]:
+        path = self.find(module)
+        if path is None:
+            raise SyntaxError(("Can't find module {}!\n"
+                               "Looked for {} in: {}"
+                              ).format(module, module + SUFFIX, ' '.join(self.search_path)))
+        self.loaded[path] = module
+        return read_interface(path)
+
+
+def loader_for(options: list[str], file_name: Optional[str] = None) -> InterfaceLoader:
+    """
+    The loader for a program in file_name, which looks next to it and
+    then in each --import-path=DIR, in order.
+    """
+    search_path = [] if file_name is None else [dirname(os.path.abspath(file_name))]
+    search_path += [option[len('import-path='):] for option in options
+                    if option.startswith('import-path=')]
+    return InterfaceLoader(search_path)
+
+
+def interface_file(output_file: str) -> str:
+    """ Where the interface for output_file goes. """
+    return os.path.splitext(output_file)[0] + SUFFIX
@@ -2,7 +2,36 @@
 Shisp Tokenizer. 
 """
 
-from dataclasses import dataclass
+import mmap
+import re
+
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from os import fstat
+from typing import Iterator, Optional
+
+
+NUMBER = re.compile('[0-9]+')
+SYMBOL = re.compile(r'[a-zA-Z\+\-\*\/]+[a-zA-Z0-9]*')
+
+LEXEME = re.compile(rb'''
+    (?P<OPEN>\()
+  | (?P<CLOSE>\))
+  | (?P<NEWLINE>\n)
+  | (?P<SPACE>[^\S\n]+)
+  | (?P<STRING>"[^"\n]*")
+  | (?P<BAD_STRING>"[^"\n]*)
+  | (?P<COMMENT>;[^\n]*\n?)
+  | (?P<QUOTE>')
+  | (?P<BACKTICK>`)
+  | (?P<COMMA>,)
+  | (?P<AT>@)
+  | (?P<WORD>[^\s()'`,@";]+)
+''', re.VERBOSE)
+
 
 @dataclass(frozen=True, repr=True)
 class Token:
@@ -12,6 +41,87 @@ class Token:
     row: int
     column: int
     char: str
+    offset: int
+
+
+class Kind(IntEnum):
+    """
+    The kinds of lexemes produced by scan.
+    """
+    OPEN = 0
+    CLOSE = 1
+    NEWLINE = 2
+    SPACE = 3
+    STRING = 4
+    BAD_STRING = 5
+    COMMENT = 6
+    QUOTE = 7
+    BACKTICK = 8
+    COMMA = 9
+    AT = 10
+    NUMBER = 11
+    SYMBOL = 12
+    ATOM = 13
+
+
+@dataclass
+class LineIndex:
+    """
+    Maps offsets into the source to (row, column) pairs.
+
+    Only the offset that each line starts at is kept, rows and
+    columns are worked out (with bisect) when something asks for them.
+
+    If source is set, offsets are into that UTF-8 buffer and
+    columns are counted in characters rather than bytes.
+    """
+    starts: array = field(default_factory=lambda: array('I', [0]))
+    source: Optional[bytes] = None
+
+    def position(self, offset: int) -> tuple[int, int]:
+        """ Returns the (row, column) of an offset, both starting at 1. """
+        row = bisect_right(self.starts, offset)
+        line_start = self.starts[row - 1]
+        if self.source is None:
+            return row, offset - line_start + 1
+        return row, len(str(self.source[line_start:offset], 'utf-8', 'replace')) + 1
+
+    def line_start(self, offset: int) -> int:
+        """ Returns the offset of the start of the line offset is on. """
+        return self.starts[bisect_right(self.starts, offset) - 1]
+
+
+@dataclass
+class TokenStore:
+    """
+    The output of scan.
+
+    The source is kept as is (as bytes, or a mmap of the file), and
+    each lexeme is stored as its start offset, end offset (exclusive)
+    and Kind, in parallel arrays.
+    """
+    source: bytes
+    starts: array = field(default_factory=lambda: array('I'))
+    ends: array = field(default_factory=lambda: array('I'))
+    kinds: array = field(default_factory=lambda: array('B'))
+    lines: LineIndex = field(default_factory=LineIndex)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def kind(self, index: int) -> Kind:
+        return Kind(self.kinds[index])
+
+    def text(self, index: int) -> str:
+        return self.decode(self.starts[index], self.ends[index])
+
+    def decode(self, start: int, end: int) -> str:
+        """ Decodes part of the source, lexemes are only decoded when needed. """
+        return str(self.source[start:end], 'utf-8')
+
+    def position(self, index: int) -> tuple[int, int]:
+        """ Returns the (row, column) that a lexeme starts at. """
+        return self.lines.position(self.starts[index])
 
 
 def parse_file(text: str) -> list[Token]:
@@ -21,8 +131,84 @@ def parse_file(text: str) -> list[Token]:
     text = text.replace('\r', '').replace('\n', '\n\r')
     lines = text.split('\r')
     tokenized = []
+    offset = 0
     for row, line in enumerate(lines, start=1):
         for column, char in enumerate(line, start=1):
-            tokenized.append(Token(row, column, char))
+            tokenized.append(Token(row, column, char, offset))
+            offset += 1
 
     return tokenized
+
+
+@contextmanager
+def open_source(file_name: str) -> Iterator[bytes]:
+    """
+    Memory-maps a source file so it can be scanned without reading
+    it into memory first.
+
+    The map is closed on exit, so anything that still needs the source
+    (like diagnostics) has to happen inside the with block.
+    """
+    with open(file_name, 'rb') as f:
+        if fstat(f.fileno()).st_size == 0:
+            # Empty files can't be mapped
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            yield source
+
+
+_GROUP_KINDS = {kind.name: kind for kind in Kind}
+_NUMBER = re.compile(NUMBER.pattern.encode())
+_SYMBOL = re.compile(SYMBOL.pattern.encode())
+_NEWLINE = ord('\n')
+
+
+def scan(source: bytes | str) -> TokenStore:
+    """
+    Scan a file into a TokenStore in a single pass.
+
+    source can be anything that supports the buffer protocol (bytes,
+    a memoryview or a mmap) and is expected to hold UTF-8. A str is
+    encoded first.
+    """
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    tokens = TokenStore(source, lines=LineIndex(source=source))
+    add_start = tokens.starts.append
+    add_end = tokens.ends.append
+    add_kind = tokens.kinds.append
+    for start, end, kind in lex(source, tokens.lines):
+        add_start(start)
+        add_end(end)
+        add_kind(kind)
+    return tokens
+
+
+def lex(source: bytes, lines: LineIndex, start: int = 0,
+        end: Optional[int] = None) -> Iterator[tuple[int, int, Kind]]:
+    """
+    Scans source lazily, yielding the (start, end, kind) of each lexeme
+    as it is found instead of storing them. Only source[start:end] is
+    scanned if they are given, but the offsets are still into source.
+
+    The start of each line is added to lines as the scan passes it, so
+    lines can place any offset that has been yielded so far.
+    """
+    add_line = lines.starts.append
+    is_number = _NUMBER.match
+    is_symbol = _SYMBOL.match
+    for match in LEXEME.finditer(source, start, len(source) if end is None else end):
+        start, end = match.span()
+        group = match.lastgroup
+        if group != 'WORD':
+            kind = _GROUP_KINDS[group]
+            if source[end - 1] == _NEWLINE:
+                add_line(end)
+        elif is_number(source, start, end):
+            kind = Kind.NUMBER
+        elif is_symbol(source, start, end):
+            kind = Kind.SYMBOL
+        else:
+            kind = Kind.ATOM
+        yield start, end, kind
@@ -2,55 +2,494 @@
 This module is the 'main' module for the bootstrap compiler.
 """
 
+import os
+import sys
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager, redirect_stdout, suppress
+from io import StringIO
+from itertools import repeat
+from os.path import abspath, basename, dirname, join, splitext
+from shutil import copyfileobj
 from sys import argv
-from typing import Optional
+from tempfile import NamedTemporaryFile
+from typing import Any, Callable, Iterable, Iterator, Optional, TextIO
 
 import lexer.tokens
 import parser
+import compiler.compiler
 import state
 import errors
 
+from shisp_ast.ast import AST
+from api import read_ast, front_end_passes, run_passes
+from build_cache import BuildCache
+from interfaces import InterfaceLoader, loader_for, write_interface, interface_file
+from prelude import Snapshot, load_prelude, prelude_file
+from timings import Timings
+from profiler import Profiler
+
+
+def print_pass_stats(passes: parser.pass_manager.PassManager):
+    print('{} walks'.format(passes.walks))
+    for name, stats in passes.stats.items():
+        print('{:<12} {:>8} visited {:>8} rewritten'.format(name, stats.visited, stats.rewritten))
+
+
+def option_value(options: list[str], name: str) -> Optional[str]:
+    """ Returns the value of a --name=value option, if it was given. """
+    for option in options:
+        if option.startswith(name + '='):
+            return option[len(name) + 1:]
+    return None
+
+
+def read_jobs(options: list[str]) -> Optional[int]:
+    """
+    The number of processes --read-jobs=N asks for, if it was given.
+    Raises ValueError if N isn't a positive number.
+    """
+    value = option_value(options, 'read-jobs')
+    if value is None:
+        return None
+    jobs = int(value)
+    if jobs < 1:
+        raise ValueError(jobs)
+    return jobs
+
+
+@contextmanager
+def replace_file(file_name: str) -> Iterator[TextIO]:
+    """
+    Opens a file to write file_name through. It replaces file_name once
+    the block is done, so nothing is left half written if it fails.
+    """
+    directory = dirname(abspath(file_name))
+    with NamedTemporaryFile('w', dir=directory, prefix='.shisp-', delete=False) as f:
+        try:
+            yield f
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.chmod(f.name, 0o666 & ~current_umask())
+    os.replace(f.name, file_name)
+
+
+def current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def compile_file(file_name: str, output_file: Optional[str], _state: state.GlobalState,
+                 timings: Timings, profiler: Optional[Profiler] = None,
+                 loader: Optional[InterfaceLoader] = None,
+                 snapshot: Optional[Snapshot] = None
+                 ) -> Optional[parser.pass_manager.PassManager]:
+    """
+    Compiles file_name to output_file, and writes its interface next to
+    it if the 'interface' option is set. loader loads what it imports,
+    and snapshot is the prelude it is compiled with.
+
+    Returns the PassManager the front end ran, or None if it failed.
+    """
+    if not output_file:
+        output_file = '{}.sh'.format(splitext(file_name)[0])
+
+    top_level = None if profiler is None else profiler.enter_form
+    with ExitStack() as files:
+        try:
+            with timings.stage('read'):
+                source = files.enter_context(lexer.tokens.open_source(file_name))
+            jobs = read_jobs(_state.options)
+            if jobs is not None and 'multipass' not in _state.options:
+                with timings.stage('parse'):
+                    ast = parser.parallel_reader.read_file(file_name, source, _state, jobs)
+                for stage in ('lex', 'desugar', 'squash'):
+                    timings.fuse(stage, 'parse')
+                timings.counted('parse', ast)
+            else:
+                with timings.stage('lex'):
+                    tokens = lexer.tokens.scan(source)
+                timings.stages['lex'].tokens = len(tokens)
+                ast = read_ast(tokens, _state, timings)
+            passes = front_end_passes(loader, preloaded(snapshot))
+            passes.top_level = top_level
+            ast = run_passes(ast, passes, timings)
+        except FileNotFoundError as missing:
+            print("File {} not found!".format(missing.filename))
+            return None
+        except errors.AbortParse:
+            print_errors(_state)
+            return None
+
+        # The output is written as it is compiled
+        with timings.stage('codegen'), replace_file(output_file) as f:
+            compiler.compiler.emit(ast, f.write, top_level, preamble(snapshot))
+        # Only once there is a script for it, and while the source (which
+        # the macros are taken from) is still open
+        if 'interface' in _state.options:
+            write_module_interface(file_name, output_file, ast, source)
+    timings.fuse('write', 'codegen')
+    return passes
 
-def run_compiler(file_name: str, output_file: Optional[str] = None):
-    file_name='test.shisp'
+
+def stream_file(file_name: str, output_file: Optional[str], _state: state.GlobalState,
+                timings: Timings, profiler: Optional[Profiler] = None,
+                loader: Optional[InterfaceLoader] = None,
+                snapshot: Optional[Snapshot] = None
+                ) -> Optional[parser.pass_manager.PassManager]:
+    """
+    Compiles file_name to output_file one top-level form at a time.
+
+    Each form is lexed, read, run through every pass and compiled before
+    the next one is read, and only the root scope is kept between them.
+    So a name has to be defined by an earlier form than the one using
+    it. The output is written to a temporary file as each form is
+    compiled, which only replaces output_file once they all have.
+
+    Returns the PassManager the front end ran, or None if it failed.
+    """
+    if not output_file:
+        output_file = '{}.sh'.format(splitext(file_name)[0])
+
+    with ExitStack() as files:
+        try:
+            with timings.stage('read'):
+                source = files.enter_context(lexer.tokens.open_source(file_name))
+        except FileNotFoundError as missing:
+            print("File {} not found!".format(missing.filename))
+            return None
+
+        passes = front_end_passes(loader, preloaded(snapshot))
+        passes.top_level = None if profiler is None else profiler.enter_form
+        try:
+            with replace_file(output_file) as output:
+                root = stream_forms(source, output.write, passes, _state, timings,
+                                    preamble(snapshot))
+        except errors.AbortParse:
+            print_errors(_state)
+            return None
+        if 'interface' in _state.options and root is not None:
+            write_module_interface(file_name, output_file, root, source)
+
+    for stage in ('lex', 'desugar', 'squash'):
+        timings.fuse(stage, 'parse')
+    for group in passes.groups():
+        for _pass in group[1:]:
+            timings.fuse(_pass.name, group[0].name)
+    timings.fuse('write', 'codegen')
+    return passes
+
+
+def stream_forms(source: bytes, write: Callable[[str], Any],
+                 passes: parser.pass_manager.PassManager,
+                 _state: state.GlobalState, timings: Timings,
+                 preamble: str = '') -> Optional[AST]:
+    tokens = lexer.tokens.TokenStore(source, lines=lexer.tokens.LineIndex(source=source))
+    lexemes = lexer.tokens.lex(source, tokens.lines)
     try:
-        with open(file_name, 'r') as f:
-            tokens = lexer.tokens.parse_file(f.read())
-    except FileNotFoundError:
-        print("File {} not found!".format(file_name))
-        return
+        return compile_forms(parser.reader.read_forms(tokens, lexemes, _state), write, passes,
+                             timings, preamble)
+    finally:
+        # The scan holds on to the source until it is closed, which has
+        # to happen before the source can be unmapped.
+        lexemes.close()
+
+
+def compile_forms(forms: Iterator[AST], write: Callable[[str], Any],
+               passes: parser.pass_manager.PassManager, timings: Timings,
+               preamble: str = '') -> Optional[AST]:
+    """
+    Runs the passes and the compiler over each form as it is read.
+    preamble is as for compiler.compiler.emit.
+
+    Returns the root, which by then holds only the global scope, or None
+    if there were no forms.
+    """
+    groups = passes.groups()
+    root = None
+
+    compiler.compiler.emit_header(write, preamble)
+    while True:
+        with timings.stage('parse'):
+            ast = next(forms, None)
+        if ast is None:
+            break
+        timings.counted('parse', ast)
+        if root is None:
+            root = ast
+            passes.start(ast, passes.passes)
+
+        for group in groups:
+            name = group[0].name
+            with timings.stage(name):
+                passes.walk(ast, group)
+            timings.counted(name, ast)
+
+        with timings.stage('codegen'):
+            compiler.compiler.emit_forms(ast, write, passes.top_level)
+    compiler.compiler.emit_footer(write)
+
+    if root is not None:
+        passes.finish(root, passes.passes)
+    return root
+
 
-    _state = state.GlobalState([file_name], {}, {}, [], file_name)
+def preloaded(snapshot: Optional[Snapshot]) -> list:
+    """ The variables the prelude in snapshot starts the global scope with. """
+    return [] if snapshot is None else snapshot.variables
+
+
+def preamble(snapshot: Optional[Snapshot]) -> str:
+    """ The prelude's script, that goes before the program's. """
+    return '' if snapshot is None else snapshot.script
+
+
+def write_module_interface(file_name: str, output_file: str, ast: AST, source: bytes):
+    """ Writes the interface of file_name next to output_file. """
+    write_interface(interface_file(output_file), splitext(basename(file_name))[0], ast, source)
+
+
+def print_errors(_state: state.GlobalState):
+    for k in _state.errors:
+        print("{}:\n".format(k))
+        for err in _state.errors[k]:
+            print(err.output)
+            print('\n')
+
+
+def run_compiler(file_name: str, output_file: Optional[str] = None,
+                 options: Optional[list[str]] = None) -> bool:
+    """
+    Compiles file_name to output_file (or file_name with .sh instead of
+    .shisp), printing any errors. Returns whether it worked.
+    """
+    _state = state.GlobalState([file_name], {}, {}, options or [], file_name)
+    timings = Timings(file_name, enabled=('timings' in _state.options or
+                                          'timings=json' in _state.options))
+    profile = option_value(_state.options, 'profile')
+    profiler = None if profile is None else Profiler(timings)
+
+    if not output_file:
+        output_file = '{}.sh'.format(splitext(file_name)[0])
+
+    outputs = {'.sh': output_file}
+    if 'interface' in _state.options:
+        outputs['.shispi'] = interface_file(output_file)
+
+    cache = BuildCache.from_options(_state.options)
+    prelude = prelude_file(_state.options)
+    key = None
+    if cache is not None:
+        # Left to the compile to report if either file is missing
+        with suppress(FileNotFoundError):
+            key = cache.key(file_name, _state.options, prelude)
+        if key is not None and (cached := cache.fetch(key)) is not None:
+            for suffix, entry_file in cached.items():
+                with open(entry_file) as entry, replace_file(outputs[suffix]) as f:
+                    copyfileobj(entry, f)
+            return True
+
+    loader = loader_for(_state.options, file_name)
+
+    timings.start()
+    if profiler is not None:
+        profiler.start()
     try:
-        ast = parser.parse_tokens.parse_tokens(tokens, _state)
-        ast = parser.desugar_source.combine_ast(ast)
-        ast = parser.simplify_ast.squash_ast(ast)
-        ast = parser.expand_metamacros.resolve_metamacros(ast)
-        ast = parser.handle_varrefs.check_variables(ast)
-        ast = parser.handle_functions.replace_references(ast)
+        with timings.stage('read'):
+            snapshot = load_prelude(_state)
+        if 'stream' in _state.options:
+            passes = stream_file(file_name, output_file, _state, timings, profiler, loader, snapshot)
+        else:
+            passes = compile_file(file_name, output_file, _state, timings, profiler, loader, snapshot)
+    except FileNotFoundError as missing:
+        print("File {} not found!".format(missing.filename))
+        return False
     except errors.AbortParse:
-        for k in _state.errors:
-            print("{}:\n".format(k))
-            for err in _state.errors[k]:
-                print(err.output)
-                print('\n')
-        return
+        print_errors(_state)
+        return False
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            # Failed compiles are often the ones worth profiling
+            profiler.write(profile)
+        timings.stop()
+    if passes is None:
+        return False
+    if key is not None:
+        cache.store(key, outputs, loader.loaded, prelude)
 
-    output = compiler.compiler.compile(ast)
+    if 'pass-stats' in _state.options:
+        print_pass_stats(passes)
+    if 'timings=json' in _state.options:
+        print(timings.to_json())
+    elif 'timings' in _state.options:
+        print(timings.report())
+    return True
+
+
+def compile_job(file_name: str, output_file: Optional[str], options: list[str]) -> tuple[bool, str]:
+    """
+    Runs run_compiler for compile_files, returning whether it worked
+    and what it printed.
+    """
+    report = StringIO()
+    with redirect_stdout(report):
+        try:
+            worked = run_compiler(file_name, output_file, options)
+        except Exception:
+            print('{}:\n'.format(file_name))
+            traceback.print_exc(file=report)
+            worked = False
+    return worked, report.getvalue()
 
-    if not output_file:
-        output_file = '{}.sh'.format(ast.program_name)
 
-    with open(output_file,'w') as f:
-        f.write(output)
+def compile_files(files: list[str], output_dir: Optional[str], jobs: Optional[int],
+                  options: list[str]) -> int:
+    """
+    Compiles each file into output_dir (or next to it), jobs at a time
+    in separate processes.
+
+    What each compile printed is printed in the order the files were
+    given, whatever order they finish in. Returns the exit status: 1 if
+    any file failed.
+    """
+    if output_dir is None:
+        outputs = [None] * len(files)
+    else:
+        outputs = [join(output_dir, '{}.sh'.format(splitext(basename(f))[0])) for f in files]
+        clashes = [f for f, output in zip(files, outputs) if outputs.count(output) > 1]
+        if clashes:
+            print('These files would be compiled to the same output: {}'.format(' '.join(clashes)))
+            return 1
+        os.makedirs(output_dir, exist_ok=True)
+
+    if jobs == 1:
+        results = map(compile_job, files, outputs, repeat(options))
+        failed = print_results(results)
+    else:
+        with ProcessPoolExecutor(jobs) as pool:
+            failed = print_results(pool.map(compile_job, files, outputs, repeat(options)))
+
+    if failed:
+        print('{} of {} files failed to compile'.format(failed, len(files)))
+    return 1 if failed else 0
+
+
+def print_results(results: Iterable[tuple[bool, str]]) -> int:
+    """ Prints each report as it comes. Returns how many failed. """
+    failed = 0
+    for worked, report in results:
+        print(report, end='', flush=True)
+        failed += not worked
+    return failed
+
+
+def split_arguments(arguments: list[str]) -> tuple[list[str], Optional[str], Optional[int]]:
+    """
+    Splits the arguments that aren't --options into the files, the -o
+    directory and the -j job count. Raises ValueError if they are wrong.
+    """
+    files = []
+    output_dir = None
+    jobs = None
+    arguments = iter(arguments)
+    for argument in arguments:
+        match argument:
+            case '-o':
+                output_dir = next(arguments)
+            case '-j':
+                jobs = int(next(arguments))
+                if jobs < 1:
+                    raise ValueError(jobs)
+            case _ if argument.startswith('--'):
+                continue
+            case _:
+                files.append(argument)
+    return files, output_dir, jobs
+
 
 def compiler_help():
-    return 'usage: python3 main.py in_file (out_file)'
-
-match argv:
-    case [a, b]:
-        run_compiler(b)
-    case [a, b, c]:
-        run_compiler(b, c)
-    case [_] | _:
+    return ('usage: python3 main.py [options] in_file (out_file)\n'
+            '       python3 main.py [options] in_file... [-o out_dir] [-j jobs]\n'
+            '\n'
+            'The first form compiles in_file to out_file, or next to it. The\n'
+            'second compiles each in_file into out_dir (or next to it), jobs at\n'
+            'a time (by default one for each CPU). An out_file ending in .shisp\n'
+            'is taken to be another in_file.\n'
+            '\n'
+            'options:\n'
+            '  --multipass   build the AST with the separate parse, desugar\n'
+            '                and squash passes instead of the reader\n'
+            '  --stream      compile one top-level form at a time, keeping only\n'
+            '                the global scope between them (names must be\n'
+            '                defined before the form that uses them)\n'
+            '  --interface   also write out_file with .shispi instead of .sh,\n'
+            '                what the file exports for (import name) to load\n'
+            '  --import-path=DIR  look for the interfaces of imported modules in\n'
+            '                DIR too, after the directory of in_file\n'
+            '  --prelude=FILE  compile with FILE as the prelude, instead of\n'
+            '                prelude.shisp next to the compiler (if there is one)\n'
+            '  --no-prelude  compile without a prelude\n'
+            '  --cache       reuse the output of an earlier compile of the same\n'
+            '                source, compiler and options (kept in\n'
+            '                $XDG_CACHE_HOME/shisp)\n'
+            '  --cache=DIR   the same, keeping the cache in DIR\n'
+            '  --read-jobs=N  lex and read a large in_file in N processes, split\n'
+            '                between its top-level forms; the passes after\n'
+            '                reading still run in this one (not with --stream or\n'
+            '                --multipass)\n'
+            '  --pass-stats  print how many nodes each pass visited and rewrote\n'
+            '  --timings     print the time, peak memory, lexemes and AST nodes\n'
+            '                for each stage (memory tracing slows the compile down)\n'
+            '  --timings=json  the same, as JSON\n'
+            '  --profile=FILE  sample the compiler and write collapsed stacks,\n'
+            '                by stage and top-level defun/depun, to FILE (even\n'
+            '                if the compile fails; only with a single in_file)')
+
+
+def main(arguments: list[str], max_jobs: Optional[int] = None) -> int:
+    """
+    Runs the command line, without the program name. Returns the exit
+    status.
+
+    max_jobs, if given, caps how many processes several files are
+    compiled with.
+    """
+    options = [a[2:] for a in arguments if a.startswith('--')]
+    try:
+        files, output_dir, jobs = split_arguments(arguments)
+    except (StopIteration, ValueError):
+        print(compiler_help())
+        return 2
+    try:
+        read_jobs(options)
+    except ValueError:
+        print('--read-jobs takes a positive number of processes.\n')
         print(compiler_help())
+        return 2
+
+    match files:
+        case [in_file] if output_dir is None and jobs is None:
+            return 0 if run_compiler(in_file, options=options) else 1
+        case [in_file, out_file] if (output_dir is None and jobs is None and
+                                     not out_file.endswith('.shisp')):
+            return 0 if run_compiler(in_file, out_file, options=options) else 1
+        case [_, _, *_] if option_value(options, 'profile') is not None:
+            print('--profile only takes one in_file, as each compile would overwrite it.\n')
+            print(compiler_help())
+            return 2
+        case [_, *_]:
+            if max_jobs is not None:
+                jobs = min(jobs or max_jobs, max_jobs)
+            return compile_files(files, output_dir, jobs, options)
+        case _:
+            print(compiler_help())
+            return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(argv[1:]))
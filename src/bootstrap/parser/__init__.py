@@ -1,2 +1,2 @@
-from . import parse_tokens, desugar_source, simplify_ast
-from . import expand_metamacros, handle_varrefs, handle_functions
+from . import parse_tokens, desugar_source, simplify_ast, reader, parallel_reader
+from . import pass_manager, expand_metamacros, handle_varrefs, handle_functions
@@ -3,195 +3,104 @@ This handles the next pass, which goes over the newly built AST.
 
 We're specifically just ensuring certain syntatic sugar is handled
 properly.
+
+Each list of children is rewritten in a single left to right sweep,
+so an Expr costs O(n) no matter how much sugar it holds.
 """
 
 import shisp_ast.ast as sast
 import shisp_ast.data_nodes as ast_data
 
-def handle_quote(node: sast.SingleQuote) -> list:
-    def handle_rc(rc: int | tuple[int, int]) -> int | tuple[int, int]:
-        match rc:
-            case (a, b):
-                return b
-            case b:
-                return b
-    match node.parent:
-        case sast.String(_):
-            return False
-        case sast.Comment(_):
-            return False
-
-    children = [c for c in node.parent.children]
-    next_node = children[children.index(node) + 1]
-
-    if isinstance(next_node, sast.SingleQuote):
-        return [c for c in handle_quote(next_node) if c is not node]
-
-    last_row = handle_rc(next_node.row)
-    last_col = handle_rc(next_node.column)
-
-    quote_Expr = sast.Expr((node.row, last_row), (node.column, last_col), [], None)
-    quote_sym = sast.Symbol(node.row, node.column, [], None, data='quote')
-    quote_Expr.add_child(quote_sym)
-    quote_Expr.add_child(next_node)
-
-    n_index = children.index(node)
-    children.insert(n_index, quote_Expr)
-    children.remove(node)
-    children.remove(next_node)
-    next_node.parent = quote_Expr
-    return children
-
-def handle_qquote(node: sast.Backtick) -> list:
-    def handle_rc(rc: int | tuple[int, int]) -> int | tuple[int, int]:
-        match rc:
-            case (a, b):
-                return b
-            case b:
-                return b
-    match node.parent:
-        case sast.String(_):
-            return False
-        case sast.Comment(_):
-            return False
-
-    children = [c for c in node.parent.children]
-    next_node = children[children.index(node) + 1]
-
-    if isinstance(next_node, sast.Backtick):
-        return [c for c in handle_qquote(next_node) if c is not node]
-
-    last_row = handle_rc(next_node.row)
-    last_col = handle_rc(next_node.column)
-
-    quote_Expr = sast.Expr((node.row, last_row), (node.column, last_col), [], None)
-    quote_sym = sast.Symbol(node.row, node.column, [], None, data='quasiquote')
-    quote_Expr.add_child(quote_sym)
-    quote_Expr.add_child(next_node)
-
-    n_index = children.index(node)
-    children.insert(n_index, quote_Expr)
-    children.remove(node)
-    children.remove(next_node)
-    next_node.parent = quote_Expr
-    combine_qquote_node(next_node)
-    return children
-
-
-def handle_unquote_splice(node: sast.At) -> list:
-    def handle_rc(rc: int | tuple[int, int]) -> int:
-        match rc:
-            case (a, b):
-                return b
-            case b:
-                return b
-    match node.parent:
-        case sast.String(_):
-            return False
-        case sast.Comment(_):
-            return False
-
-    children = [c for c in node.parent.children]
-    next_node = children[children.index(node) + 1]
-
-    match next_node:
-        case sast.At(_):
-            return [c for c in handle_unquote_splice(next_node) if c is not node]
-
-    last_row = handle_rc(next_node.row)
-    last_col = handle_rc(next_node.column)
-
-    quote_Expr = sast.Expr((node.row, last_row), (node.column, last_col), [], None)
-    quote_sym = sast.Symbol(node.row, node.column, [], None, data='unquote-splice')
-    quote_Expr.add_child(quote_sym)
-    quote_Expr.add_child(next_node)
-
-    n_index = children.index(node)
-    children.insert(n_index, quote_Expr)
-    children.remove(node)
-    children.remove(next_node)
-    next_node.parent = quote_Expr
-    combine_node(next_node)
-    return children
-
-def handle_unquote(node: sast.Comma) -> list:
-    def handle_rc(rc: int | tuple[int, int]) -> int:
-        match rc:
-            case (a, b):
-                return b
-            case b:
-                return b
-    match node.parent:
-        case sast.String(_):
-            return False
-        case sast.Comment(_):
-            return False
-
-    children = [c for c in node.parent.children]
-    next_node = children[children.index(node) + 1]
-
-    match next_node:
-        case sast.Comma(_):
-            return [c for c in handle_unquote(next_node) if c is not node]
-        case sast.At(_):
-            return [c for c in handle_unquote_splice(next_node) if c is not node]
-
-    last_row = handle_rc(next_node.row)
-    last_col = handle_rc(next_node.column)
-
-    quote_Expr = sast.Expr((node.row, last_row), (node.column, last_col), [], None)
-    quote_sym = sast.Symbol(node.row, node.column, [], None, data='unquote')
-    quote_Expr.add_child(quote_sym)
-    quote_Expr.add_child(next_node)
-
-    n_index = children.index(node)
-    children.insert(n_index, quote_Expr)
-    children.remove(node)
-    children.remove(next_node)
-    next_node.parent = quote_Expr
-    combine_node(next_node)
-    return children
-
-def handle_qquote_expr(node: sast.Expr) -> bool:
-    for child in node.children[:]:
-        recall = combine_qquote_node(child)
-        if recall and recall != node.children:
-            node.children = recall
-            handle_qquote_expr(node)
-            return False
-
-def handle_expr(node: sast.Expr) -> bool:
-    for child in node.children[:]:
-        recall = combine_node(child)
-        if recall and recall != node.children:
-            node.children = recall
-            handle_expr(node)
-            return False
-
-def combine_qquote_node(node: sast.Node) -> bool | list:
-    match node:
-        case sast.Expr(_):
-            return handle_qquote_expr(node)
-        case sast.Comma(_):
-            return handle_unquote(node)
-        case _:
-            return False
-
-def combine_node(node: sast.Node) -> bool | list:
-    match node:
-        case sast.Expr(_) if node.children[0] != 'shell-literal':
-            return handle_expr(node)
-        case sast.SingleQuote(_):
-            return handle_quote(node)
-        case sast.Backtick(_):
-            return handle_qquote(node)
-        case sast.Comma(_):
-            return handle_unquote(node)
-        case _:
-            return False
+from typing import Optional
+
+
+READER_MACROS = {
+    sast.SingleQuote: 'quote',
+    sast.Backtick: 'quasiquote',
+    sast.Comma: 'unquote',
+}
+
+
+def sugar_expr(name: str, start: int, end: int) -> sast.Expr:
+    """
+    Makes the Expr a reader macro expands to, without its argument.
+    """
+    expr = sast.Expr(start, end, list(), None)
+    expr.add_child(sast.Symbol(start, end, sast.NO_CHILDREN, None, data=name))
+    return expr
+
+
+def finish_sugar(sugar: list[sast.Expr], node: Optional[sast.Node], end: int) -> sast.Expr:
+    """
+    Puts node into the innermost waiting reader macro, and each reader
+    macro into the one before it.
+
+    node is None when there is nothing left for the reader macro to
+    apply to, which leaves it empty (like '(quote)').
+
+    Returns the outermost reader macro, and empties sugar.
+    """
+    for expr in reversed(sugar):
+        if node is not None:
+            expr.add_child(node)
+        expr.end = end
+        node = expr
+    sugar.clear()
+    return node
+
+
+def combine_children(children: list[sast.Node]) -> list[sast.Node]:
+    """
+    Returns children with all of the reader macros replaced.
+
+    A reader macro applies to the node right after it (even if that is
+    whitespace or the EndExpr). A run of the same reader macro counts
+    as one, so ''x is 'x, and a ',' followed by '@' is unquote-splice.
+
+    The Exprs in children are left as they are, see combine_expr.
+    """
+    combined = []
+    # Reader macros still waiting for what they apply to, outermost first.
+    sugar = []
+    for child in children:
+        match child:
+            case sast.SingleQuote(_) | sast.Backtick(_) | sast.Comma(_):
+                name = READER_MACROS[type(child)]
+                if sugar and sugar[-1].children[0].data == name:
+                    sugar[-1] = sugar_expr(name, child.start, child.end)
+                else:
+                    sugar.append(sugar_expr(name, child.start, child.end))
+                continue
+            case sast.At(_) if sugar and sugar[-1].children[0].data in ('unquote', 'unquote-splice'):
+                sugar[-1] = sugar_expr('unquote-splice', child.start, child.end)
+                continue
+
+        if sugar:
+            child = finish_sugar(sugar, child, child.end)
+        combined.append(child)
+
+    if sugar:
+        combined.append(finish_sugar(sugar, None, sugar[-1].end))
+    return combined
+
+
+def combine_expr(node: sast.Expr):
+    """
+    Replaces the reader macros in an Expr, and everything inside it.
+
+    Each Expr is combined on its own, so the Exprs inside it are just
+    put on a stack to do after it.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        stack.extend([child for child in node.children if isinstance(child, sast.Expr)])
+        node.children = combine_children(node.children)
+        for child in node.children:
+            child.parent = node
 
 
 def combine_ast(ast: sast.AST) -> sast.AST:
-    combine_node(ast.base_node)
+    combine_expr(ast.base_node)
     ast.base_node.scope = ast_data.Scope()
     return ast
@@ -4,60 +4,71 @@ For the third pass of the parser
 This handles expansion of all metamacros (let and defun)
 """
 
-from shisp_ast.ast import AST, Node, Expr, Symbol, ReturnNode
-from shisp_ast.data_nodes import Scope
-import shisp_builtins as builtin
-
-def search_children(children: list[Node], *, qq: bool = False):
-    for child in children:
-        match child:
-            case ReturnNode(_) if not qq:
-                search_children(child.children, qq=qq)
-
-            case Expr(_):
-                search_children(child.children, qq=qq)
-
-            case Symbol(data=builtin.Let.name) if not qq:
-                new_node = builtin.Let.meta_eval(child.parent)
-                child.parent.replace(new_node)
-                search_children(new_node.body)
-
-            case Symbol(data=builtin.Defun.name) if not qq:
-                new_node = builtin.Defun.meta_eval(child.parent)
-                child.parent.replace(new_node)
-                search_children(new_node.body)
-            case Symbol(data=builtin.Depun.name) if not qq:
-                new_node = builtin.Depun.meta_eval(child.parent)
-                child.parent.replace(new_node)
-                search_children(new_node.body)
-
-            case Symbol(data=builtin.Demac.name) if not qq:
-                new_node = builtin.Demac.meta_eval(child.parent)
-                child.parent.replace(new_node)
-                search_children(new_node.body)
-
-            case Symbol(data=builtin.Quote.name) if not qq:
-                new_node = builtin.Quote.meta_eval(child.parent)
-                child.parent.replace(new_node)
-            case Symbol(data=builtin.Shell_Literal.name) if not qq:
-                new_node = builtin.Shell_Literal.meta_eval(child.parent)
-                child.parent.replace(new_node)
-            case Symbol(data=builtin.QuasiQuote.name) if not qq:
-                new_node = builtin.QuasiQuote.meta_eval(child.parent)
-                child.parent.replace(new_node)
-                search_children([new_node.body], qq=True)
-
-            case Symbol(data=builtin.Unquote.name):
-                new_node = builtin.Unquote.meta_eval(child.parent)
-                child.parent.replace(new_node)
-                search_children([new_body.body], qq=False) 
-            case Symbol(data=builtin.Unquote_Splice.name):
-                new_node = builtin.Unquote_Splice.meta_eval(child.parent)
-                child.parent.replace(new_node)
-                search_children([new_body.body], qq=False) 
+from typing import Callable, Iterable, Optional
+
+from shisp_ast.ast import AST, Expr, Symbol, MacroCall
+from shisp_ast.data_nodes import Scope, Variable, BUILTINS
+from parser.pass_manager import Pass, PassManager, SKIP
+
+# Defines (and so registers) the builtin metamacros
+import shisp_builtins
+
+def expand(node: Expr) -> Optional[MacroCall]:
+    """
+    Expands an Expr if it is a metamacro call, that is if its head is a
+    Symbol naming one in BUILTINS.
+    """
+    match node:
+        case Expr(children=[Symbol(data=name), *_]) if name in BUILTINS:
+            return BUILTINS[name].meta_eval(node)
+
+
+def search_body(node: MacroCall):
+    """
+    Only walks into the body of the metamacros that want it searched.
+    """
+    if not node.macro.search_body:
+        return SKIP
+
+
+def reset_scope(ast: AST):
+    ast.base_node.scope = Scope()
+
+
+def metamacro_pass(load_interface: Optional[Callable[[str], Iterable[Variable]]] = None,
+                   preloaded: Iterable[Variable] = ()) -> Pass:
+    """
+    Expands the metamacros.
+
+    load_interface returns what a module exports, for import (see
+    interfaces.InterfaceLoader). Without it import is an error.
+
+    preloaded are put in the global scope before anything else (like
+    the prelude's, see prelude), so the program can redefine them.
+    """
+    root = None
+
+    def start(ast: AST):
+        nonlocal root
+        reset_scope(ast)
+        root = ast.base_node
+        for variable in preloaded:
+            root.scope.add_variable(variable)
+
+    def expand_imports(node: Expr) -> Optional[MacroCall]:
+        result = expand(node)
+        if isinstance(result, MacroCall) and result.macro_name == 'import':
+            module = result.args.data
+            if node.parent is not root:
+                raise SyntaxError("import {} has to be at the top level!".format(module))
+            if load_interface is None:
+                raise SyntaxError("Can't import {}, there are no interfaces to load here!".format(module))
+            for variable in load_interface(module):
+                root.scope.add_variable(variable)
+        return result
+
+    return Pass('metamacros', {Expr: expand_imports, MacroCall: search_body}, start=start)
+
 
 def resolve_metamacros(ast: AST) -> AST:
-    base_node = ast.base_node
-    base_node.scope = Scope()
-    search_children(base_node.children)
-    return ast
+    return PassManager([metamacro_pass()]).run(ast)
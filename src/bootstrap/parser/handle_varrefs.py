@@ -2,83 +2,118 @@
 For the fourth pass of the parser.
 
 This checks all variables after expansion.
+
+References are resolved against the Scopes of the Exprs the resolver
+is inside of (see Environment), and each Symbol is replaced with a
+VariableRef holding the Variable it refers to.
 """
 
+from dataclasses import dataclass, field
 from typing import Optional
 
-from shisp_ast.ast import Expr, Node, Symbol, MacroCall, VariableRef, ReturnNode
+from shisp_ast.ast import AST, Expr, Node, Symbol, MacroCall, VariableRef
 from shisp_ast.data_nodes import *
-import shisp_builtins as sbuilt
+from parser.pass_manager import Pass, PassManager, SKIP
+
+# Defines (and so registers) the builtin metamacros
+import shisp_builtins
+
 
+@dataclass
+class Environment:
+    """
+    The variables in scope at the point the resolver is at.
+
+    Each name maps to a stack of its bindings, innermost last. A Scope's
+    variables are pushed when the resolver enters the Expr that holds
+    it, and popped when it leaves, so looking up a reference is O(1)
+    however deeply it is nested.
 
-def check_scope(node: Node, name: str) -> tuple[bool, Optional[Variable]]:
+    The root scope is looked in last rather than being entered, so
+    variables added to it while the resolver is walking (when compiling
+    one top-level form at a time) are found too. After it come the
+    builtins, which every compile shares.
     """
-    Checks if a variable is in scope.
-    If not returns false.
+    bindings: dict[str, list[Variable]] = field(default_factory=dict)
+    root: Optional[Scope] = None
+
+    def enter(self, scope: Scope):
+        for name, variable in scope.variables.items():
+            self.bindings.setdefault(name, []).append(variable)
+
+    def leave(self, scope: Scope):
+        for name in scope.variables:
+            bindings = self.bindings[name]
+            bindings.pop()
+            if not bindings:
+                del self.bindings[name]
+
+    def lookup(self, name: str) -> Optional[Variable]:
+        """ Returns the innermost binding for name, or None. """
+        try:
+            return self.bindings[name][-1]
+        except KeyError:
+            pass
+        if self.root is not None and (variable := self.root.variables.get(name)) is not None:
+            return variable
+        return BUILTINS.get(name)
+
+
+def resolve_symbol(child: Symbol, env: Environment) -> VariableRef:
     """
-    try:
-        return name in node.scope.variables, node.scope.variables[name]
-    except (AttributeError, KeyError):
-        return False, None
-
-
-def check_var_in_scope(node: Node, name: str) -> tuple[bool, Optional[Variable]]:
-    in_scope, var = check_scope(node, name)
-    if in_scope:
-        return True, var
-    else:
-        if node.parent is None:
-            return False, None
-        else:
-            return check_var_in_scope(node.parent, name)
-
-
-def check_node(child: Node):
-    match child:
-        case ReturnNode(_):
-            check_node(child.children[0])
-        case Symbol(_):
-            in_scope, var = check_var_in_scope(child.parent, child.escape_data())
-            if not in_scope:
-                raise SyntaxError(("Variable {} is undefined!\n"
-                                   "TODO: Better Error"
-                                  ).format(child.data))
-            var_ref = VariableRef.from_node(child)
-            var_ref.data = var
-            child.replace(var_ref)
+    Returns the VariableRef to replace a Symbol with.
+    """
+    var = env.lookup(child.escape_data())
+    if var is None:
+        raise SyntaxError(("Variable {} is undefined!\n"
+                           "TODO: Better Error"
+                          ).format(child.data))
+    var_ref = VariableRef.from_node(child)
+    var_ref.data = var
+    return var_ref
+
+
+def skip_quoted(node: MacroCall):
+    match node:
         case (MacroCall(macro_name="shell-literal") | MacroCall(macro_name='quote') |
         MacroCall(macro_name="quasiquote")):
-            pass
-        case MacroCall(_):
-            check_node(child.body[0])
-        case Expr(_):
-            check_node_children(child)
+            return SKIP
 
 
-def check_node_children(node: Node):
+def variable_pass() -> Pass:
     """
-    Checks nodes for variables
+    Replaces each Symbol with a VariableRef to the Variable it names.
+
+    Scopes are entered and left as the walk goes in and out of the
+    Exprs that hold them.
     """
-    for child in node.children:
-        match child:
-            case Symbol(_) | MacroCall(_) | ReturnNode(_):
-                check_node(child)
-            case Expr(_):
-                check_node_children(child)
+    env = Environment()
+
+    def start(ast: AST):
+        env.root = ast.base_node.scope
+
+    def finish(ast: AST):
+        env.root = None
+
+    def enter(node: Expr):
+        if node.introduces_scope:
+            env.enter(node.scope)
+
+    def leave(node: Expr):
+        if node.introduces_scope:
+            env.leave(node.scope)
+
+    return Pass('varrefs',
+                {Symbol: lambda node: resolve_symbol(node, env),
+                 MacroCall: skip_quoted,
+                 Expr: enter},
+                leavers={Expr: leave},
+                start=start,
+                finish=finish)
 
 
-def check_variables(ast):
+def check_variables(ast: AST) -> AST:
     """
     Checks variable scopes
     """
-    base_node = ast.base_node
-    base_node.scope.add_variable(sbuilt.Let)
-    base_node.scope.add_variable(sbuilt.Defun)
-    base_node.scope.add_variable(sbuilt.Depun)
-    base_node.scope.add_variable(sbuilt.Shell_Literal)
-    base_node.scope.add_variable(sbuilt.Quote)
-    base_node.scope.add_variable(sbuilt.QuasiQuote)
-    base_node.scope.add_variable(sbuilt.Unquote)
-    base_node.scope.add_variable(sbuilt.Unquote_Splice)
-    check_node_children(base_node)
-    return ast
+    return PassManager([variable_pass()]).run(ast)
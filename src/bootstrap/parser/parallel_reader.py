@@ -0,0 +1,166 @@
+"""
+Reads a large source file with several processes.
+
+A quick scan (form_ends) finds where each top-level form ends, keeping
+track of the paren depth and skipping strings and comments. The forms
+are grouped into chunks, and each chunk is lexed and read by
+parser.reader in a worker process, which maps the same file. So the
+offsets in the nodes it sends back are already offsets into the whole
+file, and their rows and columns come out right from the LineIndex
+made here. The top-level nodes of each chunk are then put under the
+root, in order.
+
+Workers send their nodes back as a shisp_ast.arena.Arena, as pickling
+the nodes themselves takes about as long as reading them.
+
+Only reading is done in parallel, the passes after it (which need the
+scopes) are run as usual.
+
+The names each worker interned are interned again here, chunk by
+chunk, so clashing names are caught across chunks too. A chunk that
+couldn't be read in a worker (because of an error in it, or a clash) is
+read again here, which reports the error just as reading the whole
+file in one go would.
+"""
+
+import re
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import shisp_ast.ast as sast
+import state as state
+
+from lexer.tokens import TokenStore, LineIndex, lex, open_source, scan
+from parser.reader import read, read_into, empty_ast
+from shisp_ast.arena import Arena
+
+
+# What the scan for form boundaries looks at: parens, and the strings
+# and comments that can hold them, matched as the lexer does.
+BOUNDARY = re.compile(rb'[()]|"[^"\n]*"?|;[^\n]*')
+NEWLINE = re.compile(rb'\n')
+
+OPEN = ord('(')
+CLOSE = ord(')')
+
+# Sources smaller than this are read in one go, and chunks are at least
+# this big.
+MIN_CHUNK = 1 << 16
+
+
+def form_ends(source: bytes) -> Optional[list[int]]:
+    """
+    Returns the offset just after each top-level form that is in parens,
+    or None if the parens don't balance (the reader reports that).
+    """
+    ends = []
+    depth = 0
+    for match in BOUNDARY.finditer(source):
+        char = source[match.start()]
+        if char == OPEN:
+            depth += 1
+        elif char == CLOSE:
+            depth -= 1
+            if depth == 0:
+                ends.append(match.end())
+            elif depth < 0:
+                return None
+    return ends if depth == 0 else None
+
+
+def chunks(ends: list[int], size: int, length: int) -> list[tuple[int, int]]:
+    """
+    Groups the forms ending at ends into (start, end) chunks of at least
+    size bytes. The last one runs to length, for anything after the
+    last form.
+    """
+    spans = []
+    start = 0
+    for end in ends:
+        if end - start >= size:
+            spans.append((start, end))
+            start = end
+    if spans and length - start < size:
+        # Too little is left over for a chunk of its own
+        start = spans.pop()[0]
+    spans.append((start, length))
+    return spans
+
+
+def line_index(source: bytes) -> LineIndex:
+    starts = array('I', [0])
+    starts.extend(match.end() for match in NEWLINE.finditer(source))
+    return LineIndex(starts, source)
+
+
+def read_chunk(file_name: str, start: int, end: int) -> tuple[Arena, list[str]]:
+    """
+    Reads the forms in file_name between start and end, in a worker.
+    Returns them as an Arena, and the names interned in the order they
+    were first seen.
+
+    Raises AbortParse if the chunk has errors, the errors themselves are
+    made when the chunk is read again.
+    """
+    with open_source(file_name) as source:
+        _state = state.GlobalState([file_name], {}, {}, [], file_name)
+        tokens = TokenStore(source)
+        ast = empty_ast(tokens)
+        read_span(ast, tokens, start, end, _state)
+    arena = Arena.from_ast(ast)
+    # The lines are made again where the chunk is used
+    arena.lines = None
+    return arena, list(_state.symbols.names)
+
+
+def read_span(ast: sast.AST, tokens: TokenStore, start: int, end: int,
+              _state: state.GlobalState):
+    """ Reads the forms in tokens.source between start and end into ast. """
+    lexemes = lex(tokens.source, LineIndex(), start, end)
+    try:
+        for _ in read_into(ast, tokens, lexemes, _state):
+            pass
+    finally:
+        # The scan holds on to the source until it is closed, which has
+        # to happen before the source can be unmapped.
+        lexemes.close()
+
+
+def read_file(file_name: str, source: bytes, _state: state.GlobalState,
+              jobs: Optional[int] = None) -> sast.AST:
+    """
+    Reads source, the contents of file_name, into the same AST that
+    parser.reader.read would, using jobs processes.
+
+    Small sources, and ones whose parens don't balance, are read in one
+    go instead.
+    """
+    size = max(MIN_CHUNK, len(source) // (4 * (jobs or 1)))
+    ends = form_ends(source)
+    spans = None if ends is None else chunks(ends, size, len(source))
+    if spans is None or len(spans) < 2:
+        return read(scan(source), _state)
+
+    tokens = TokenStore(source, lines=line_index(source))
+    ast = empty_ast(tokens)
+    root = ast.base_node
+    with ProcessPoolExecutor(jobs) as pool:
+        results = [pool.submit(read_chunk, file_name, start, end) for start, end in spans]
+        try:
+            for (start, end), result in zip(spans, results):
+                try:
+                    arena, names = result.result()
+                    for name in names:
+                        _state.symbols.intern(name)
+                except Exception:
+                    # Whatever went wrong, reading the chunk here either
+                    # works or reports the error as read would have.
+                    read_span(ast, tokens, start, end, _state)
+                    continue
+                root.add_children(arena.to_ast().base_node.children)
+        finally:
+            # Don't read the chunks after an error
+            pool.shutdown(cancel_futures=True)
+    return ast
@@ -7,19 +7,19 @@ We only need to make sure things are syntatically correct
 at this stage.
 """
 
-import re
-
 import shisp_ast.ast as sast
 import state as state
 import errors as error
 
+from array import array
 from contextlib import suppress
 from dataclasses import dataclass
 from typing import Optional, Any
 
 from shisp_ast.data_nodes import Scope
+from shisp_ast.symbols import ManglingCollision
 from errors import ParserError, AbortParse
-from lexer.tokens import Token
+from lexer.tokens import Token, TokenStore, LineIndex, Kind, NUMBER, SYMBOL
 
 
 def is_number(tokens: str) -> bool:
@@ -27,7 +27,7 @@ def is_number(tokens: str) -> bool:
     Checks to see if a collection of tokens is a 'number'
     for Shisp purposes.
     """
-    return re.match('[0-9]+', tokens)
+    return NUMBER.match(tokens)
 
 
 def is_symbol(tokens: str) -> bool:
@@ -35,7 +35,7 @@ def is_symbol(tokens: str) -> bool:
     Checks to see if a collection of tokens is a 'string'
     for Shisp purposes.
     """
-    return re.match('[a-zA-Z\+\-\*\/]+[a-zA-Z0-9]*', tokens)
+    return SYMBOL.match(tokens)
 
 
 @dataclass
@@ -48,6 +48,12 @@ class ParserState:
     global_state: state.GlobalState
     all_tokens: list[Token]
 
+    # Indexes into all_tokens, for the current token, the first token on
+    # the current line and the '"' that opened the current String.
+    position: int = 0
+    line_start: int = 0
+    string_start: int = 0
+
 def handle_tokens(state: ParserState) -> tuple[sast.Atom | sast.Symbol | sast.Number, ParserState]:
     """
     Handles contexts where we need to deal with multiple tokens.
@@ -70,40 +76,19 @@ def handle_token(token: Token, state: ParserState) -> ParserState:
     basecom = isinstance(state.base_node, sast.Comment)
     match token:
         case Token(char='\n') if basestr:
-            ci = state.all_tokens.index(token)
-            li = [t.char for t in state.all_tokens[:ci][::-1]].index('\n')
-            li = state.all_tokens[:ci][::-1][li]
-            li = state.all_tokens.index(li)
-
-            si = [t.char for t in state.all_tokens[li:ci][::-1]].index('"') 
-            si = state.all_tokens[:ci][::-1][si]
-            si = state.all_tokens.index(si)
-
-            line = state.all_tokens[li+1:ci]
-            lli = 0
-            lsi = [t.char for t in line].index('"')
-
-            error_start = "Newline can't be in String!\n"
-            error_message = ("In file {} at line {}\n"
-                             "String begins at {}, end of line at {}\n"
-                             "\n"
-                            ).format(state.global_state.current_file,
-                                     token.row,
-                                     state.all_tokens[si].column,
-                                     token.column)
-            line_display = "".join([t.char for t in line])
-            bottom_disp = [' ' for t in line[lli:lsi]]
-            bottom_disp_ = ['~' for t in line[lsi:]]
-            bottom_disp = ''.join([*bottom_disp, '\n', *bottom_disp_, '^'])
-            
-            err = ParserError(output='{}{}{}{}'.format(error_start, error_message, line_display, bottom_disp),
-                              context=None)
+            line = state.all_tokens[state.line_start:state.position]
+            err = string_newline_error(state.global_state.current_file,
+                                       token.row,
+                                       state.all_tokens[state.string_start].column,
+                                       token.column,
+                                       ''.join([t.char for t in line]))
             state.global_state.add_error(err)
 
             raise AbortParse()
         case Token(char='\n') if basecom:
             state.tokens.append(token)
             state.base_node.data = ''.join([c.char for c in state.tokens])
+            state.base_node.end = token.offset + 1
             state.base_node = state.base_node.parent
             state.tokens.clear()
 
@@ -137,10 +122,12 @@ def handle_token(token: Token, state: ParserState) -> ParserState:
         case Token(char='"') if basestr:
             state.tokens.append(token)
             state.base_node.data = ''.join([c.char for c in state.tokens])
+            state.base_node.end = token.offset + 1
             state.base_node = state.base_node.parent
             state.tokens.clear()
         case Token(char='"') if not basestr:
             state.tokens.append(token)
+            state.string_start = state.position
             state.base_node.add_child(sast.String.from_token(token))
             state.base_node = state.base_node.children[-1]
 
@@ -174,8 +161,115 @@ def parse_tokens(text: list[Token], state: state.GlobalState) -> sast.AST:
     Parse a list of tokens into an AST
     """
     base_node = sast.Expr(0, 0, list(), None)
-    ast = sast.AST(base_node)
+    lines = LineIndex(array('I', [0, *[t.offset + 1 for t in text if t.char == '\n']]))
+    ast = sast.AST(base_node, lines)
     state = ParserState([], base_node, state, text)
-    for token in text:
+    for position, token in enumerate(text):
+        state.position = position
         state = handle_token(token, state)
+        if token.char == '\n':
+            state.line_start = position + 1
+    return ast
+
+
+def string_newline_error(file: str, row: int, string_column: int,
+                         end_column: int, line: str) -> ParserError:
+    """
+    Builds the error for a String that runs into the end of a line.
+
+    line is the text of the line up to (but not including) the newline.
+    """
+    error_start = "Newline can't be in String!\n"
+    error_message = ("In file {} at line {}\n"
+                     "String begins at {}, end of line at {}\n"
+                     "\n"
+                    ).format(file, row, string_column, end_column)
+    bottom_disp = '{}{}^'.format(' ' * (string_column - 1),
+                                 '~' * (end_column - string_column))
+    return ParserError(output='{}{}{}\n{}'.format(error_start, error_message,
+                                                 line, bottom_disp),
+                       context=None)
+
+
+def bad_string_error(tokens: TokenStore, start: int, end: int, file: str) -> ParserError:
+    """
+    Builds the error for a BAD_STRING lexeme.
+    """
+    row, column = tokens.lines.position(start)
+    _, end_column = tokens.lines.position(end)
+    line = tokens.decode(tokens.lines.line_start(start), end)
+    return string_newline_error(file, row, column, end_column, line)
+
+
+def unmatched_close_error(tokens: TokenStore, start: int, file: str) -> ParserError:
+    """
+    Builds the error for a ')' that doesn't close anything.
+    """
+    row, column = tokens.lines.position(start)
+    return ParserError(output=("Unmatched ')'!\n"
+                               "In file {} at line {}, column {}\n"
+                              ).format(file, row, column),
+                       context=None)
+
+
+def mangling_collision_error(tokens: TokenStore, start: int,
+                             collision: ManglingCollision, file: str) -> ParserError:
+    """
+    Builds the error for a Symbol that mangles to the same shell name
+    as another one.
+    """
+    row, column = tokens.lines.position(start)
+    return ParserError(output=("Symbol {} clashes with {}, both are {} in the shell!\n"
+                               "In file {} at line {}, column {}\n"
+                              ).format(collision.name, collision.other, collision.mangled,
+                                       file, row, column),
+                       context=None)
+
+
+LEXEME_NODES = {
+    Kind.SPACE: sast.Space,
+    Kind.NEWLINE: sast.NewLine,
+    Kind.QUOTE: sast.SingleQuote,
+    Kind.BACKTICK: sast.Backtick,
+    Kind.COMMA: sast.Comma,
+    Kind.AT: sast.At,
+    Kind.NUMBER: sast.Number,
+    Kind.SYMBOL: sast.Symbol,
+    Kind.ATOM: sast.Atom,
+    Kind.STRING: sast.String,
+}
+
+
+def parse_lexemes(tokens: TokenStore, state: state.GlobalState) -> sast.AST:
+    """
+    Parse the lexemes in a TokenStore (see lexer.tokens.scan) into an AST.
+
+    This builds the same tree as parse_tokens does, but works on
+    whole lexemes instead of single characters.
+    """
+    base_node = sast.Expr(0, 0, list(), None)
+    ast = sast.AST(base_node, tokens.lines)
+    node = base_node
+    decode = tokens.decode
+    for start, end, kind in zip(tokens.starts, tokens.ends, tokens.kinds):
+        match kind:
+            case Kind.OPEN:
+                expr = sast.Expr(start, end, list(), None, data='(')
+                node.add_child(expr)
+                node = expr
+            case Kind.CLOSE if node.parent is None:
+                state.add_error(unmatched_close_error(tokens, start, state.current_file))
+                raise AbortParse()
+            case Kind.CLOSE:
+                node.add_child(sast.EndExpr(start, end, sast.NO_CHILDREN, None, data=')'))
+                node = node.parent
+            case Kind.COMMENT:
+                node.add_child(sast.Comment(start, end, sast.NO_CHILDREN, None,
+                                            data=decode(start + 1, end)))
+            case Kind.BAD_STRING:
+                state.add_error(bad_string_error(tokens, start, end, state.current_file))
+                raise AbortParse()
+            case kind:
+                node.add_child(LEXEME_NODES[kind](start, end, sast.NO_CHILDREN, None,
+                                                  data=decode(start, end)))
     return ast
@@ -0,0 +1,211 @@
+"""
+Runs passes over the AST.
+
+A pass is a set of visitors, keyed by node class. The PassManager
+walks the tree and hands each node to the visitors of every pass in
+turn, so passes that don't need the pass before them to have seen the
+whole tree first (see Pass.fuses) share one walk.
+
+A visitor can return:
+  None         to leave the node as it is and walk into it
+  SKIP         to not walk into the node (for that pass)
+  a new node   to replace the node with, the new node is then visited
+               by the same pass (and the ones after it) and walked into
+
+The walk goes into the children of Exprs and ReturnNodes, and the body
+of MacroCalls.
+
+Passes can also be run over a program one top-level form at a time
+(see parser.reader.read_forms): start them once, walk each form with
+every group in turn, and finish them after the last form.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from shisp_ast.ast import AST, BaseNode, Expr, MacroCall, ReturnNode
+
+
+# Returned by a visitor to not walk into a node.
+SKIP = object()
+
+
+@dataclass
+class PassStats:
+    """
+    How many nodes a pass visited, and how many of them it replaced.
+    """
+    visited: int = 0
+    rewritten: int = 0
+
+
+@dataclass
+class Pass:
+    """
+    A pass over the AST.
+
+    visitors are called on each node the pass visits (see the module
+    docstring), leavers once the walk is done with a node's children.
+    Both are looked up by the node's class, or the nearest base class
+    that has one.
+
+    start and finish are called with the AST before and after the walk.
+
+    If fuses is set the pass shares the walk of the pass before it,
+    otherwise it starts a new walk once the ones before it are done.
+    """
+    name: str
+    visitors: dict[type, Callable[[BaseNode], Any]]
+    leavers: dict[type, Callable[[BaseNode], None]] = field(default_factory=dict)
+    start: Optional[Callable[[AST], None]] = None
+    finish: Optional[Callable[[AST], None]] = None
+    fuses: bool = False
+
+    _visitor_cache: dict = field(default_factory=dict, init=False, repr=False)
+    _leaver_cache: dict = field(default_factory=dict, init=False, repr=False)
+
+    def visitor(self, node: BaseNode) -> Optional[Callable[[BaseNode], Any]]:
+        return _lookup(self.visitors, self._visitor_cache, type(node))
+
+    def leaver(self, node: BaseNode) -> Optional[Callable[[BaseNode], None]]:
+        return _lookup(self.leavers, self._leaver_cache, type(node))
+
+
+def _lookup(table: dict, cache: dict, node_type: type):
+    try:
+        return cache[node_type]
+    except KeyError:
+        for base in node_type.__mro__:
+            if base in table:
+                cache[node_type] = table[base]
+                break
+        else:
+            cache[node_type] = None
+        return cache[node_type]
+
+
+def walk_children(node: BaseNode) -> Optional[list]:
+    """ Returns what the walk goes into for a node, or None. """
+    match node:
+        case Expr(_) | ReturnNode(_):
+            return node.children
+        case MacroCall(body=list()):
+            return node.body
+        case MacroCall(_):
+            # unquote and unquote-splice hold the node itself
+            return [node.body]
+    return None
+
+
+def count_nodes(ast: AST) -> int:
+    """ Counts the nodes a walk would go through, and the root. """
+    count = 0
+    stack = [ast.base_node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if (inside := walk_children(node)) is not None:
+            stack.extend(inside)
+    return count
+
+
+@dataclass
+class PassManager:
+    """
+    Runs passes over an AST, fusing the walks of those that can share.
+
+    stats holds a PassStats for each pass by name, and walks how many
+    times the tree was walked.
+
+    top_level, if set, is called with each top-level node as a walk
+    gets to it.
+    """
+    passes: list[Pass]
+    stats: dict[str, PassStats] = field(default_factory=dict)
+    walks: int = 0
+    top_level: Optional[Callable[[BaseNode], None]] = None
+
+    def groups(self) -> list[list[Pass]]:
+        """ Splits the passes into the groups that share a walk. """
+        groups = []
+        for _pass in self.passes:
+            if groups and _pass.fuses:
+                groups[-1].append(_pass)
+            else:
+                groups.append([_pass])
+        return groups
+
+    def run(self, ast: AST) -> AST:
+        for group in self.groups():
+            self.run_group(ast, group)
+        return ast
+
+    def run_group(self, ast: AST, group: list[Pass]):
+        """ Runs a group of passes (see groups) in one walk. """
+        self.start(ast, group)
+        self.walk(ast, group)
+        self.finish(ast, group)
+
+    def start(self, ast: AST, passes: list[Pass]):
+        """ Starts passes on ast, before they walk it. """
+        for _pass in passes:
+            self.stats[_pass.name] = PassStats()
+            if _pass.start is not None:
+                _pass.start(ast)
+
+    def finish(self, ast: AST, passes: list[Pass]):
+        """ Finishes passes on ast, once they are done walking it. """
+        for _pass in passes:
+            if _pass.finish is not None:
+                _pass.finish(ast)
+
+    def walk(self, ast: AST, passes: list[Pass]):
+        """
+        Walks the tree under the root once, visiting each node with
+        every pass in passes that hasn't skipped it.
+
+        Which passes are still walking is kept as a bit mask, along with
+        the iterator over each list of children on the stack.
+        """
+        self.walks += 1
+        stats = [self.stats[_pass.name] for _pass in passes]
+        everything = (1 << len(passes)) - 1
+        stack = [(iter(ast.base_node.children), everything, None)]
+
+        while stack:
+            children, active, parent = stack[-1]
+            node = next(children, None)
+            if node is None:
+                stack.pop()
+                if parent is not None:
+                    self.leave(parent, passes, active)
+                continue
+            if parent is None and self.top_level is not None:
+                self.top_level(node)
+
+            index = 0
+            while index < len(passes):
+                bit = 1 << index
+                if not active & bit:
+                    index += 1
+                    continue
+                stats[index].visited += 1
+                visitor = passes[index].visitor(node)
+                result = None if visitor is None else visitor(node)
+                if result is SKIP:
+                    active &= ~bit
+                elif result is not None and result is not node:
+                    node.replace(result)
+                    stats[index].rewritten += 1
+                    node = result
+                    continue
+                index += 1
+
+            if active and (inside := walk_children(node)) is not None:
+                stack.append((iter(inside), active, node))
+
+    @staticmethod
+    def leave(node: BaseNode, passes: list[Pass], active: int):
+        for index, _pass in enumerate(passes):
+            if active & (1 << index) and (leaver := _pass.leaver(node)) is not None:
+                leaver(node)
@@ -0,0 +1,156 @@
+"""
+A single pass reader.
+
+This builds the same AST that parse_lexemes, desugar_source and
+simplify_ast build between them, straight from the lexemes. No
+whitespace nodes are ever made, and reader macros are turned into
+their (quote ...), (quasiquote ...), (unquote ...) and
+(unquote-splice ...) forms as they are read.
+"""
+
+from typing import Iterable, Iterator
+
+import shisp_ast.ast as sast
+import state as state
+
+from errors import AbortParse
+from lexer.tokens import TokenStore, Kind
+from shisp_ast import symbols
+from shisp_ast.data_nodes import Scope
+from parser.parse_tokens import bad_string_error, unmatched_close_error, mangling_collision_error
+from parser.desugar_source import sugar_expr, finish_sugar
+
+
+READER_MACROS = {
+    Kind.QUOTE: 'quote',
+    Kind.BACKTICK: 'quasiquote',
+    Kind.COMMA: 'unquote',
+}
+
+ATOM_NODES = {
+    Kind.NUMBER: sast.Number,
+    Kind.SYMBOL: sast.Symbol,
+    Kind.ATOM: sast.Atom,
+    Kind.STRING: sast.String,
+}
+
+
+def read(tokens: TokenStore, state: state.GlobalState) -> sast.AST:
+    """
+    Reads the lexemes in a TokenStore into a simplified, desugared AST.
+    """
+    ast = empty_ast(tokens)
+    for _ in read_into(ast, tokens, zip(tokens.starts, tokens.ends, tokens.kinds), state):
+        pass
+    return ast
+
+
+def read_forms(tokens: TokenStore, lexemes: Iterable[tuple[int, int, int]],
+               state: state.GlobalState) -> Iterator[sast.AST]:
+    """
+    Reads lexemes (say from lexer.tokens.lex) one top-level form at a
+    time.
+
+    The same AST is yielded after each form is read, with that form as
+    the only child of its root. The form is dropped when the next one
+    is read, so the root (and its scope) is all that is kept between
+    forms.
+
+    tokens is only used for its source and lines, for diagnostics.
+    """
+    ast = empty_ast(tokens)
+    for _ in read_into(ast, tokens, lexemes, state):
+        yield ast
+        ast.base_node.children.clear()
+
+
+def empty_ast(tokens: TokenStore) -> sast.AST:
+    return sast.AST(sast.Expr(0, 0, list(), None, scope=Scope()), tokens.lines)
+
+
+def read_into(ast: sast.AST, tokens: TokenStore, lexemes: Iterable[tuple[int, int, int]],
+              state: state.GlobalState) -> Iterator[None]:
+    """
+    Reads lexemes into the root of ast, yielding each time a top-level
+    form is done.
+    """
+    base_node = ast.base_node
+    decode = tokens.decode
+    intern = state.symbols.intern
+
+    # Open Exprs, the innermost one is last.
+    exprs = [base_node]
+    # Reader macros still waiting for what they apply to, outermost first.
+    sugar = []
+
+    for start, end, kind in lexemes:
+        match kind:
+            case Kind.SPACE | Kind.NEWLINE:
+                if sugar:
+                    exprs[-1].add_child(finish_sugar(sugar, None, end))
+                    if len(exprs) == 1:
+                        yield
+
+            case Kind.QUOTE | Kind.BACKTICK | Kind.COMMA:
+                name = READER_MACROS[kind]
+                # ''x is read the same as 'x
+                if sugar and sugar[-1].children[0].data == name:
+                    sugar[-1] = sugar_expr(name, start, end)
+                else:
+                    sugar.append(sugar_expr(name, start, end))
+            case Kind.AT if sugar and sugar[-1].children[0].data in ('unquote', 'unquote-splice'):
+                sugar[-1] = sugar_expr('unquote-splice', start, end)
+            case Kind.AT:
+                if sugar:
+                    exprs[-1].add_child(finish_sugar(sugar, None, end))
+                    if len(exprs) == 1:
+                        yield
+
+            case Kind.OPEN:
+                expr = sast.Expr(start, end, list(), None)
+                if sugar:
+                    exprs[-1].add_child(finish_sugar(sugar, expr, end))
+                else:
+                    exprs[-1].add_child(expr)
+                exprs.append(expr)
+            case Kind.CLOSE if len(exprs) == 1:
+                state.add_error(unmatched_close_error(tokens, start, state.current_file))
+                raise AbortParse()
+            case Kind.CLOSE:
+                if sugar:
+                    exprs[-1].add_child(finish_sugar(sugar, None, end))
+                exprs.pop()
+                if len(exprs) == 1:
+                    yield
+
+            case Kind.BAD_STRING:
+                state.add_error(bad_string_error(tokens, start, end, state.current_file))
+                raise AbortParse()
+
+            case _:
+                if kind == Kind.COMMENT:
+                    node = sast.Comment(start, end, sast.NO_CHILDREN, None,
+                                        data=decode(start + 1, end))
+                elif kind == Kind.SYMBOL:
+                    try:
+                        name = intern(decode(start, end))
+                    except symbols.ManglingCollision as collision:
+                        state.add_error(mangling_collision_error(tokens, start, collision,
+                                                                 state.current_file))
+                        raise AbortParse()
+                    node = sast.Symbol(start, end, sast.NO_CHILDREN, None, data=name)
+                else:
+                    node = ATOM_NODES[kind](start, end, sast.NO_CHILDREN, None,
+                                            data=decode(start, end))
+                if sugar:
+                    node = finish_sugar(sugar, node, end)
+                exprs[-1].add_child(node)
+                if len(exprs) == 1:
+                    yield
+
+    if sugar:
+        exprs[-1].add_child(finish_sugar(sugar, None, sugar[-1].end))
+    # A form left open at the end is read as if it had been closed there,
+    # so it still has to be handed on.
+    if sugar or len(exprs) > 1:
+        yield
@@ -4,20 +4,40 @@ For the second pass of the parser.
 The second pass simplifies the AST greately.
 """
 
-from shisp_ast.ast import AST, Node, Comment, Expr, Number, MacroCall, Space, Atom, Symbol, String
+from shisp_ast.ast import AST, Node, Comment, Expr, Number, MacroCall, Space, Atom, Symbol, String, NO_CHILDREN
 from shisp_ast.data_nodes import Scope
+from shisp_ast import symbols
 
 
 def squash_comment(comment: Comment) -> Comment:
-    return Comment(comment.row, comment.column, [], None, comment.data)
-
-
-def squash_list(old_list: Expr) -> Expr:
-    new_list = Expr(old_list.row, old_list.column, children=[], parent=None)
-
-    for child in old_list.children:
-        if (new_child := squash_node(child)) is not None:
-            new_list.add_child(new_child)
+    return Comment(comment.start, comment.end, NO_CHILDREN, None, comment.data)
+
+
+def squash_list(old_list: Expr, table: symbols.SymbolTable = symbols.SYMBOLS) -> Expr:
+    """
+    Squashes an Expr and everything inside it, interning its symbols in
+    table.
+
+    The Exprs that are still being squashed are kept on a stack, with
+    the iterator over their children, so this doesn't recurse however
+    deeply they are nested.
+    """
+    new_list = Expr(old_list.start, old_list.end, children=[], parent=None)
+    stack = [(iter(old_list.children), new_list)]
+
+    while stack:
+        children, expr = stack[-1]
+        for child in children:
+            match child:
+                case Expr(_):
+                    new_child = Expr(child.start, child.end, children=[], parent=None)
+                    expr.add_child(new_child)
+                    stack.append((iter(child.children), new_child))
+                    break
+            if (new_child := squash_node(child, table)) is not None:
+                expr.add_child(new_child)
+        else:
+            stack.pop()
 
     return new_list
 
@@ -30,28 +50,32 @@ def squash_symbol(sym: Symbol) -> Symbol:
     return Symbol.from_node(sym, False)
 
 
-def squash_node(node: Node):
+def squash_node(node: Node, table: symbols.SymbolTable = symbols.SYMBOLS):
     match node:
         case Space(_):
             return None
         case Comment(_):
             return squash_comment(node)
         case Number(_):
-            return Number(node.row, node.column, [], None, node.data)
+            return Number(node.start, node.end, NO_CHILDREN, None, node.data)
         case Expr(_):
-            return squash_list(node)
+            return squash_list(node, table)
         case Symbol(_):
-            return Symbol(node.row, node.column, [], None, node.data)
+            return Symbol(node.start, node.end, NO_CHILDREN, None, table.intern(node.data))
         case String(_):
-            return String(node.row, node.column, [], None, data=node.data)
+            return String(node.start, node.end, NO_CHILDREN, None, data=node.data)
         case Atom(_):
-            return Atom(node.row, node.column, [], None, data=atom.data)
+            return Atom(node.start, node.end, NO_CHILDREN, None, data=node.data)
 
     print(node)
     raise SyntaxError("Unknown Node")
 
 
-def squash_ast(ast: AST) -> AST:
-    ast.base_node = squash_node(ast.base_node)
+def squash_ast(ast: AST, table: symbols.SymbolTable = symbols.SYMBOLS) -> AST:
+    """
+    Squashes the whole AST. Its symbols are interned in table, which
+    should be the compile's own (GlobalState.symbols).
+    """
+    ast.base_node = squash_node(ast.base_node, table)
     ast.base_node.scope = Scope()
     return ast
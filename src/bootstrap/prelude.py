@@ -0,0 +1,174 @@
+"""
+The prelude, and the snapshot of it that compiles load.
+
+The prelude is a Shisp file every program is compiled with: its global
+scope is put in the program's, and its script goes at the top of the
+program's. It is prelude.shisp next to the compiler if there is one, or
+the file --prelude=FILE names. --no-prelude leaves it out.
+
+Rather than lexing, reading and running the passes over the prelude for
+every compile, it is done once and a Snapshot of the outcome (the
+variables in its global scope, with the macros and functions they
+hold, and its compiled script) is pickled. Later compiles load it with
+one pickle.load. Snapshots are kept under the build cache directory
+(see build_cache), keyed by the prelude's source and the compiler, so
+changing either makes a new one.
+"""
+
+import hashlib
+import os
+import pickle
+
+from contextlib import suppress
+from dataclasses import dataclass
+from tempfile import NamedTemporaryFile
+from typing import Optional
+
+import lexer.tokens
+import compiler.compiler
+import state
+
+# Not from api import ..., as api imports this module too
+import api
+
+from build_cache import BOOTSTRAP, BuildCache, compiler_version, default_directory, file_digest
+from interfaces import arglist, loader_for
+from shisp_ast.data_nodes import Scope, Function, Macro, Imported
+
+
+# The prelude used when --prelude isn't given, if it exists.
+DEFAULT_PRELUDE = str(BOOTSTRAP / 'prelude.shisp')
+
+SUFFIX = '.snapshot'
+
+# The snapshots loaded so far, by path. They never change once written.
+LOADED: dict[str, "Snapshot"] = {}
+
+
+@dataclass
+class Snapshot:
+    """
+    What compiling the prelude made: the variables in its global scope,
+    as Imported ones, and the script for its forms (without the header
+    and footer every script has).
+    """
+    variables: list[Imported]
+    script: str
+
+
+def prelude_file(options: list[str]) -> Optional[str]:
+    """ The prelude the options ask for, or None for no prelude. """
+    if 'no-prelude' in options:
+        return None
+    for option in options:
+        if option.startswith('prelude='):
+            return option[len('prelude='):]
+    return DEFAULT_PRELUDE if os.path.exists(DEFAULT_PRELUDE) else None
+
+
+def snapshot_directory(options: list[str]) -> str:
+    """ Where snapshots go: the --cache=DIR directory, or the default one. """
+    cache = BuildCache.from_options(options)
+    directory = default_directory() if cache is None else cache.directory
+    return os.path.join(directory, 'prelude')
+
+
+def snapshot_key(file_name: str) -> str:
+    digest = hashlib.sha256()
+    for part in (file_digest(file_name), compiler_version()):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def build(file_name: str, _state: state.GlobalState) -> Snapshot:
+    """
+    Compiles the prelude in file_name. Its errors are added to _state
+    under file_name.
+
+    Raises AbortParse if it has errors.
+    """
+    current_file = _state.current_file
+    _state.change_file(file_name)
+    try:
+        with lexer.tokens.open_source(file_name) as source:
+            ast = api.read_ast(lexer.tokens.scan(source), _state)
+        ast = api.front_end_passes(loader_for([], file_name)).run(ast)
+    finally:
+        _state.change_file(current_file)
+
+    script = []
+    compiler.compiler.emit_forms(ast, script.append)
+    # Only what the variables reach is pickled, not the whole tree
+    for child in ast.base_node.children:
+        child.parent = None
+    module = os.path.splitext(os.path.basename(file_name))[0]
+    variables = [Imported(variable.name, snapshot_value(variable.value), module)
+                 for variable in ast.base_node.scope.variables.values()]
+    return Snapshot(variables, ''.join(script))
+
+
+def snapshot_value(value):
+    """
+    What is kept of a variable's value. A function's body is already in
+    the script, so only its arguments are kept, macros are kept whole.
+    """
+    match value:
+        case Macro(_):
+            return value
+        case Function(args=args):
+            return type(value)(Scope(), None, arglist([arg.data for arg in args.children]))
+    return value
+
+
+def read_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    Loads the snapshot at path, if there is one. Each is only loaded
+    once per process (which matters for the compile server).
+    """
+    with suppress(KeyError):
+        return LOADED[path]
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    LOADED[path] = snapshot
+    return snapshot
+
+
+def write_snapshot(path: str, snapshot: Snapshot):
+    """
+    Pickles snapshot to path, through a temporary file so compiles
+    running at the same time never load half of one.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with NamedTemporaryFile('wb', dir=os.path.dirname(path), delete=False) as f:
+        try:
+            pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # Too deeply nested to pickle, it is built every time instead
+            f.close()
+            os.unlink(f.name)
+            return
+    os.replace(f.name, path)
+
+
+def load_prelude(_state: state.GlobalState) -> Optional[Snapshot]:
+    """
+    The snapshot of the prelude for the compile in _state, building it
+    if it hasn't been yet. None if there is no prelude.
+
+    Raises AbortParse if the prelude has errors, and FileNotFoundError
+    if a --prelude=FILE doesn't exist.
+    """
+    file_name = prelude_file(_state.options)
+    if file_name is None:
+        return None
+    path = os.path.join(snapshot_directory(_state.options), snapshot_key(file_name) + SUFFIX)
+    snapshot = read_snapshot(path)
+    if snapshot is None:
+        snapshot = build(file_name, _state)
+        write_snapshot(path, snapshot)
+        LOADED[path] = snapshot
+    return snapshot
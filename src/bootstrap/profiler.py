@@ -0,0 +1,82 @@
+"""
+A sampling profiler for the --profile option.
+
+The stack is sampled every so much CPU time (on SIGPROF), and the
+samples are written out as collapsed stacks, one "frame;frame;... count"
+line per distinct stack, which flamegraph tools read.
+
+Each stack starts with the stage that was running and, in the stages
+that walk the top-level forms, the form being worked on, so time spent
+in a defun or depun shows up under its name.
+"""
+
+import signal
+
+from collections import Counter
+from dataclasses import dataclass, field
+from os.path import basename
+from typing import Optional
+
+from shisp_ast.ast import BaseNode, Expr, MacroCall, Symbol
+from timings import Timings
+
+
+# Seconds of CPU time between samples.
+INTERVAL = 0.001
+
+# The form for top-level code that isn't in a defun or depun.
+TOP_LEVEL = '(top level)'
+
+
+def form_name(node: BaseNode) -> str:
+    """ Names a top-level form for the profile. """
+    match node:
+        case Expr(children=[Symbol(data='defun' | 'depun' as macro), Symbol(data=name), *_]):
+            return '({} {})'.format(macro, name)
+        case MacroCall(macro_name='defun' | 'depun' as macro, children=[Symbol(data=name), *_]):
+            return '({} {})'.format(macro, name)
+    return TOP_LEVEL
+
+
+@dataclass
+class Profiler:
+    """
+    Samples the stack while running, keyed by the stage timings says is
+    running and the form last passed to enter_form in that stage.
+    """
+    timings: Timings
+    interval: float = INTERVAL
+    samples: Counter = field(default_factory=Counter)
+    form: Optional[tuple[str, str]] = None
+
+    def start(self):
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def enter_form(self, node: BaseNode):
+        """ Called with each top-level node as a stage gets to it. """
+        self.form = (self.timings.current, form_name(node))
+
+    def sample(self, signum, frame):
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append('{}:{}'.format(basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        stage = self.timings.current
+        if self.form is not None and self.form[0] == stage:
+            frames.append(self.form[1])
+        frames.append(stage or '(no stage)')
+        self.samples[tuple(reversed(frames))] += 1
+
+    def folded(self) -> str:
+        return ''.join('{} {}\n'.format(';'.join(stack), count)
+                       for stack, count in sorted(self.samples.items()))
+
+    def write(self, file_name: str):
+        with open(file_name, 'w') as f:
+            f.write(self.folded())
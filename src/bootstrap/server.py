@@ -0,0 +1,150 @@
+"""
+A compile server, so a build doesn't pay for starting Python and
+importing the compiler for every file.
+
+The server listens on a Unix socket and keeps a pool of worker
+processes with the compiler already imported. client.py is used in
+place of main.py: it sends its command line over, and prints what the
+compile printed and exits with its status, as main.py would have.
+
+A request is JSON, ended by the client shutting down its side of the
+connection (so it can be any size), and is answered with one line of
+JSON:
+    {"argv": [arguments to main.py], "cwd": "directory to run them in"}
+    {"status": exit status, "output": "what main.py printed"}
+
+or, to compile source text with api.compile_source:
+    {"source": "the program", "filename": "for diagnostics", "options": [...]}
+    {"status": 0 or 1, "output": "the errors", "script": "the script, or null"}
+
+Compiles run in the workers, so several clients are served at once.
+The workers keep the compiler they started with, so restart the
+server after changing the compiler.
+
+Usage: python3 server.py [--socket=PATH] [-j jobs]
+"""
+
+import asyncio
+import json
+import os
+import signal
+import sys
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import Optional
+
+import main
+from api import compile_source
+from build_cache import compiler_version
+
+
+def default_socket() -> str:
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'shisp.sock')
+    return '/tmp/shisp-{}.sock'.format(os.getuid())
+
+
+def run_command(arguments: list[str], cwd: str) -> tuple[int, str]:
+    """
+    Runs main.main in cwd, in a worker. Returns the exit status and what
+    it printed.
+
+    Several files in one request are compiled one after another in the
+    worker, other requests are what the other workers are for.
+    """
+    report = StringIO()
+    with redirect_stdout(report):
+        try:
+            os.chdir(cwd)
+            status = main.main(arguments, max_jobs=1)
+        except Exception:
+            traceback.print_exc(file=report)
+            status = 1
+    return status, report.getvalue()
+
+
+def run_source(source: str, filename: str, options: list[str]) -> tuple[int, str, Optional[str]]:
+    """
+    Compiles source text, in a worker. Returns the status, the errors
+    and the script.
+    """
+    try:
+        result = compile_source(source, filename=filename, options=options)
+    except SyntaxError as error:
+        return 1, '{}:\n\n{}\n'.format(filename, error), None
+    except Exception:
+        # A bug in the compiler, reported as run_command would
+        return 1, '{}:\n\n{}'.format(filename, traceback.format_exc()), None
+    report = ''.join('{}\n\n'.format(error.output) for error in result.errors)
+    return (0 if result.ok else 1), report, result.output
+
+
+async def handle(pool: ProcessPoolExecutor, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter):
+    loop = asyncio.get_running_loop()
+    try:
+        request = json.loads(await reader.read())
+        if 'source' in request:
+            job = (run_source, str(request['source']), str(request.get('filename', '<source>')),
+                   [str(option) for option in request.get('options', [])])
+        else:
+            job = (run_command, [str(argument) for argument in request['argv']],
+                   str(request['cwd']))
+    except (ValueError, KeyError, TypeError) as error:
+        reply = {'status': 2, 'output': 'Bad request: {}\n'.format(error)}
+    else:
+        match await loop.run_in_executor(pool, *job):
+            case status, output:
+                reply = {'status': status, 'output': output}
+            case status, output, script:
+                reply = {'status': status, 'output': output, 'script': script}
+
+    writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def serve(socket_path: str, jobs: Optional[int]):
+    # Worked out once, before the workers start, so they all agree on
+    # it and it is for the compiler they actually run.
+    compiler_version()
+
+    with ProcessPoolExecutor(jobs) as pool:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(
+            lambda reader, writer: handle(pool, reader, writer), path=socket_path)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+
+        print('Listening on {}'.format(socket_path), flush=True)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            os.unlink(socket_path)
+
+
+def run(arguments: list[str]) -> int:
+    socket_path = main.option_value([a[2:] for a in arguments if a.startswith('--')], 'socket')
+    try:
+        _, _, jobs = main.split_arguments(arguments)
+    except (StopIteration, ValueError):
+        print(__doc__.strip().splitlines()[-1])
+        return 2
+    asyncio.run(serve(socket_path or default_socket(), jobs))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run(sys.argv[1:]))
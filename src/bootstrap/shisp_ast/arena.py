@@ -0,0 +1,128 @@
+"""
+An arena representation of the AST, for keeping a lot of ASTs around.
+
+Nodes are stored as ints indexing into parallel arrays instead of as
+objects. This only holds the trees that parser.reader.read builds
+(Exprs and leaves), the later passes still need a real AST, see
+Arena.to_ast.
+
+--read-jobs uses it to send the forms read in worker processes back
+(see parser.parallel_reader), as an Arena pickles much faster than the
+nodes it holds.
+"""
+
+import sys
+
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+import shisp_ast.ast as sast
+
+from lexer.tokens import LineIndex
+from shisp_ast.data_nodes import Scope
+
+
+NODE_KINDS = (
+    sast.Expr,
+    sast.Symbol,
+    sast.Number,
+    sast.String,
+    sast.Atom,
+    sast.Comment,
+)
+
+_KIND_CODES = {kind: code for code, kind in enumerate(NODE_KINDS)}
+
+
+@dataclass
+class Arena:
+    """
+    A whole AST, in parallel arrays.
+
+    Nodes are in pre-order, so the root is 0 and a node's children come
+    right after it. sizes holds how many nodes are in each subtree
+    (counting the node itself), so the next sibling of i is
+    i + sizes[i]. The root's parent is -1.
+
+    Data strings are interned, so a name that shows up many times is
+    only stored once.
+    """
+    kinds: array = field(default_factory=lambda: array('B'))
+    starts: array = field(default_factory=lambda: array('I'))
+    ends: array = field(default_factory=lambda: array('I'))
+    parents: array = field(default_factory=lambda: array('i'))
+    sizes: array = field(default_factory=lambda: array('I'))
+    data: list = field(default_factory=list)
+    lines: Optional[LineIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def kind(self, index: int) -> type:
+        """ Returns the node class of a node. """
+        return NODE_KINDS[self.kinds[index]]
+
+    def children(self, index: int) -> Iterator[int]:
+        """ Yields the children of a node, in order. """
+        child = index + 1
+        end = index + self.sizes[index]
+        while child < end:
+            yield child
+            child += self.sizes[child]
+
+    @classmethod
+    def from_ast(cls, ast: sast.AST) -> "Arena":
+        """
+        Packs an AST into an Arena.
+
+        Raises TypeError on nodes the reader doesn't make (like the
+        MacroCalls from resolve_metamacros).
+        """
+        arena = cls(lines=ast.lines)
+        add_kind = arena.kinds.append
+        add_start = arena.starts.append
+        add_end = arena.ends.append
+        add_parent = arena.parents.append
+        add_data = arena.data.append
+
+        stack = [(ast.base_node, -1)]
+        while stack:
+            node, parent = stack.pop()
+            try:
+                add_kind(_KIND_CODES[type(node)])
+            except KeyError:
+                raise TypeError("{} can't go in an Arena".format(node.__class__.__name__)) from None
+            add_start(node.start)
+            add_end(node.end)
+            add_parent(parent)
+            add_data(None if node.data is None else sys.intern(node.data))
+            if node.children:
+                index = len(arena.kinds) - 1
+                stack.extend([(child, index) for child in reversed(node.children)])
+
+        # Children always come after their parent, so going backwards
+        # each subtree is finished before it is added to its parent.
+        sizes = arena.sizes
+        sizes.extend([1] * len(arena.kinds))
+        parents = arena.parents
+        for index in range(len(sizes) - 1, 0, -1):
+            sizes[parents[index]] += sizes[index]
+        return arena
+
+    def to_ast(self) -> sast.AST:
+        """ Unpacks the Arena back into an AST of nodes. """
+        nodes = []
+        for kind, start, end, parent, data in zip(self.kinds, self.starts, self.ends,
+                                                  self.parents, self.data):
+            if kind == 0:
+                node = sast.Expr(start, end, list(), None, data=data)
+            else:
+                node = NODE_KINDS[kind](start, end, sast.NO_CHILDREN, None, data=data)
+            if parent >= 0:
+                nodes[parent].add_child(node)
+            nodes.append(node)
+
+        base_node = nodes[0]
+        base_node.scope = Scope()
+        return sast.AST(base_node, self.lines)
@@ -3,9 +3,17 @@ Contains all AST related stuff
 """
 
 from typing import Optional, Any
-from dataclasses import dataclass 
+from contextlib import suppress
+from dataclasses import dataclass, field
 
-from lexer.tokens import Token
+from lexer.tokens import Token, LineIndex
+from shisp_ast import symbols
+
+
+# Leaves (Symbols, Numbers, Strings, ...) all share this instead of
+# each holding their own empty list. It's a tuple so that nothing can
+# add to it by accident.
+NO_CHILDREN: tuple = ()
 
 
 @dataclass
@@ -14,6 +22,7 @@ class AST:
     Represents the Abstract Syntax Tree for the Shisp Program.
     """
     base_node: "Expr"
+    lines: Optional[LineIndex] = None
 
 
     def print_children(self, node, indent=0):
@@ -22,7 +31,7 @@ class AST:
         """
         output = ''
         for child in node.children:
-            for line in str(child).split('\n'):
+            for line in child.__str__(lines=self.lines).split('\n'):
                 output = '{}{}|-- {}\n'.format(output, ' ' * indent, line)
             
             if child.children:
@@ -38,83 +47,174 @@ class AST:
         Prints out the ast
         """
         base_node = str(self.base_node)
-        base_node = '{}{}'.format(self.base_node,
+        base_node = '{}{}'.format(self.base_node.__str__(lines=self.lines),
                                     self.print_children(self.base_node))
         print(base_node)
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class BaseNode:
-    row: int | tuple[int] 
-    column: int | tuple[int]
-    children: list["Node"]
+    """
+    Nodes compare (and hash) by identity, comparing two nodes never
+    walks the tree.
+
+    index is where the node is in its parent's children. It is kept up
+    to date by add_child and replace_child, and checked before it is
+    used, so code that builds children lists by hand still works.
+
+    Nodes are slotted, and leaves use NO_CHILDREN for their children.
+    start and end are offsets into the source, see position.
+    """
+    start: int
+    end: int
+    children: list["Node"] | tuple
     parent: Optional["Node"]
- 
-    def __str__(self, *args, **kwargs):
+    index: int = field(default=0, init=False, repr=False)
+
+    def position(self, lines: LineIndex) -> tuple[int | tuple[int, int], int | tuple[int, int]]:
+        """
+        Works out the row and column of the node.
+
+        Nodes only hold offsets into the source, so this needs the
+        LineIndex for it. Nodes spanning more than one character get
+        (start, end) tuples.
+        """
+        row, col = lines.position(self.start)
+        if self.end - self.start <= 1:
+            return row, col
+        end_row, end_col = lines.position(self.end - 1)
+        return (row, end_row), (col, end_col)
+
+    def __str__(self, *args, lines: Optional[LineIndex] = None, **kwargs):
+        if lines is None:
+            output = ('Type: {type}\n'
+                      'Span: {start}..{end}\n')
+            return output.format(type=self.__class__.__name__, start=self.start, end=self.end)
         output = ('Type: {type}\n'
                   'Row:  {row}\n'
                   'Col:  {col}\n')
-        return output.format(type=self.__class__.__name__, row=self.row, col=self.column)
+        row, col = self.position(lines)
+        return output.format(type=self.__class__.__name__, row=row, col=col)
 
-@dataclass
+    def reindex(self):
+        """ Updates the index of all children. """
+        for index, child in enumerate(self.children):
+            child.index = index
+
+    def child_index(self, child: "BaseNode") -> int:
+        """
+        Returns where child is in children.
+
+        This is O(1), unless children was changed without going through
+        the node, then the children are reindexed first.
+
+        Raises ValueError if child isn't a child of this node.
+        """
+        index = child.index
+        if index < len(self.children) and self.children[index] is child:
+            return index
+        self.reindex()
+        index = child.index
+        if index < len(self.children) and self.children[index] is child:
+            return index
+        raise ValueError("{} is not a child".format(child.__class__.__name__))
+
+    def adopt_children(self, children: list["Node"]):
+        """ Makes this node the parent of children, and sets their index. """
+        for index, child in enumerate(children):
+            child.replace_parent(self)
+            child.index = index
+
+    def replace_parent(self, new_parent):
+        self.parent = new_parent
+
+@dataclass(eq=False, slots=True)
 class Node(BaseNode):
     data: Optional[Any] = None
 
     @classmethod
     def from_node(cls, node: "Node") -> "Node":
-        return cls(node.row, node.column, list(), None, data=node.data)
+        return cls(node.start, node.end, NO_CHILDREN, None, data=node.data)
 
     @classmethod
     def from_token(cls, token: Token) -> "Node":
         """ Turns a Token into a Node. """
-        return cls(token.row, token.column, list(), None, data=token.char)
+        return cls(token.offset, token.offset + 1, list(), None, data=token.char)
 
     @classmethod
     def from_tokens(cls, tokens: list[Token]) -> "Node":
-        row = (tokens[0].row, tokens[-1].row)
-        col = (tokens[0].column, tokens[-1].column)
-        return cls(row, col, list(), None, data=''.join([t.char for t in tokens]))
+        return cls(tokens[0].offset, tokens[-1].offset + 1, list(), None,
+                   data=''.join([t.char for t in tokens]))
 
     def replace_child(self, child, replacement):
         """ Replaces a child with another one """
-        index = self.children.index(child)
-        self.children.insert(index, replacement)
-        self.children.remove(child)
+        index = self.child_index(child)
+        self.children[index] = replacement
         replacement.parent = self
-        if not replacement.children:
+        replacement.index = index
+        if not replacement.children and child.children:
             replacement.children = [c for c in child.children]
-        for _child in replacement.children:
-            _child.replace_parent(replacement)
-        child.children.clear()
+        replacement.adopt_children(replacement.children)
+        if child.children:
+            child.children.clear()
 
     def replace(self, replacement):
         self.parent.replace_child(self, replacement)
 
-    def replace_parent(self, new_parent):
-        self.parent = new_parent
-
     def add_child(self, child: "Node"):
         """ Adds a child to a node. """
+        child.index = len(self.children)
         self.children.append(child)
         child.parent = self
 
+    def insert_child(self, index: int, child: "Node"):
+        """
+        Inserts a child before index.
+
+        The children after it have to be reindexed, so this is O(n - index).
+        """
+        self.children.insert(index, child)
+        child.parent = self
+        for _index in range(index, len(self.children)):
+            self.children[_index].index = _index
+
+    def remove_child(self, child: "Node"):
+        """
+        Removes a child.
+
+        The children after it have to be reindexed, so this is O(n - index).
+        """
+        index = self.child_index(child)
+        del self.children[index]
+        for _index in range(index, len(self.children)):
+            self.children[_index].index = _index
+
     def add_children(self, children: list["Node"]):
         """ Adds children to a node. """
         for child in children:
             self.add_child(child)
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Expr(Node):
     scope: Optional["Scope"] = None
+
+    @property
+    def introduces_scope(self) -> bool:
+        """
+        True if names can be bound in this Expr (the root, and function
+        and macro bodies), those get a Scope. Other Exprs don't.
+        """
+        return self.scope is not None
+
     def __str__(self, *args, **kwargs):
-        base = super().__str__(*args, **kwargs)
+        base = BaseNode.__str__(self, *args, **kwargs)
         if self.scope is not None:
             return ('{}'
                     'Scope: {}\n'
                    ).format(base, list(self.scope.variables.keys()))
         return base
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class MacroCall(BaseNode):
     macro: Node
     macro_name :str
@@ -122,16 +222,11 @@ class MacroCall(BaseNode):
     body: "list"
 
     def __str__(self, *args, **kwargs):
-        base = super().__str__(*args, **kwargs)
+        base = BaseNode.__str__(self, *args, **kwargs)
         output = ('{}'
-                  'Name: {}\n'
-                  'Args: {}\n')
-        output = ('Type: {type}\n'
-                  'Row:  {row}\n'
-                  'Col:  {col}\n'
-                  'Name: {name}\n')
+                  'Name: {}\n')
 
-        return output.format(type=self.__class__.__name__, row=self.row, col=self.column, name=self.macro_name)
+        return output.format(base, self.macro_name)
 
     def switch_body(self):
         t = self.body
@@ -142,33 +237,27 @@ class MacroCall(BaseNode):
         """ Replaces a child with another one """
         match self.body:
             case [_]:
-                if len(self.body) == 1:
-                    self.body = [replacement]
-                    replacement.parent = self
-                elif len(self.body) > 1:
-                    index = self.body.index(child)
-                    self.body.insert(index, replacement)
-                    self.body.remove(child)
-                    replacement.parent = self
-
-        if child in self.children:
-            index = self.children.index(child)
-            self.children.insert(index, replacement)
-            self.children.remove(child)
+                self.body = [replacement]
+                replacement.parent = self
+
+        with suppress(ValueError):
+            index = self.child_index(child)
+            self.children[index] = replacement
             replacement.parent = self
-            if not replacement.children:
+            replacement.index = index
+            if not replacement.children and child.children:
                 replacement.children = [c for c in child.children]
-            for _child in child.children:
-                _child.replace_parent(replacement)
-            child.children.clear()
+            replacement.adopt_children(child.children)
+            if child.children:
+                child.children.clear()
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Atom(Node):
     data: Optional[Any] = None
 
     def __str__(self, *args, **kwargs):
-        base = super().__str__(*args, **kwargs)
+        base = BaseNode.__str__(self, *args, **kwargs)
         output = ('{}'
                   'Data: {}'
                  ).format(base, self.data)
@@ -178,7 +267,7 @@ class Atom(Node):
     @classmethod
     def from_token(cls, token: Token) -> "Node":
         """ Turns a Token into a Node. """
-        return cls(token.row, token.column, list(), None, token.char)
+        return cls(token.offset, token.offset + 1, list(), None, token.char)
 
 
     @classmethod
@@ -186,100 +275,83 @@ class Atom(Node):
         if not tokens:
             raise Exception("Tokens is empty!")
         symbol = ''.join([t.char for t in tokens])
-        row = (tokens[0].row, tokens[-1].row)
-        col = (tokens[0].column, tokens[-1].column)
-        return cls(row, col, list(), None, symbol)
+        return cls(tokens[0].offset, tokens[-1].offset + 1, list(), None, symbol)
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Space(Node):
-    data = ' '
+    pass
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Symbol(Atom):
     def escape_data(self):
-        def escape(c):
-            match c:
-                case '+':
-                    return 'plus'
-                case '-':
-                    return 'minus'
-                case '/':
-                    return 'div'
-                case '*':
-                    return 'star'
-                case _:
-                    return c
-
-        escaped = []
-        for c in self.data:
-            escaped.append(escape(c))
-        return ''.join(escaped)
+        """ Returns the mangled (shell-safe) name, see shisp_ast.symbols. """
+        return symbols.mangle(self.data)
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Comment(Atom):
     pass
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class AtomSym(Atom):
     pass
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Number(Atom):
     pass
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class DoubleQuote(Space):
-    data = '"'
+    pass
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class NewLine(Space):
-    data = '\n'
+    pass
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class String(Atom):
     pass
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class EndExpr(Space):
-    data = ')'
+    pass
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Semicolon(Space):
-    data = ';'
+    pass
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class SingleQuote(Space):
-    data = "'"
+    pass
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Backtick(Space):
-    data = '`'
+    pass
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Comma(Space):
-    data = ','
+    pass
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class At(Space):
-    data = '@'
+    pass
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class VariableRef(Node):
     pass
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class FunctionCall(Node):
     is_pure: bool = False
     is_macro: bool = False
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class ReturnNode(Node):
     pass
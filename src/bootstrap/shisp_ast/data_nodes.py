@@ -3,7 +3,7 @@ Holds data nodes for the ast
 """
 
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, ClassVar, Optional
 
 from shisp_ast.ast import Node
 
@@ -32,10 +32,42 @@ class Variable():
                ).format(name=self.name, value=self.value)
 
 
+# Every Builtin, by name. See Builtin.
+BUILTINS: dict[str, type["Builtin"]] = {}
+
+
+def register_builtin(builtin: type["Builtin"]) -> type["Builtin"]:
+    """
+    Adds a Builtin to BUILTINS, replacing any with the same name.
+
+    Builtin subclasses are registered when they are defined, so this
+    is only needed to register one again (say after it was replaced).
+    """
+    BUILTINS[builtin.name] = builtin
+    return builtin
+
+
 @dataclass
 class Builtin(Variable):
+    """
+    A builtin metamacro.
+
+    Every subclass with a name is added to BUILTINS when it is defined,
+    which is all it takes for resolve_metamacros to expand calls to it
+    and for check_variables to put it in the root scope.
+
+    After a call is expanded the body of the MacroCall is searched for
+    more metamacros if search_body is set.
+    """
     name: str
 
+    search_body: ClassVar[bool] = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if isinstance(getattr(cls, 'name', None), str):
+            register_builtin(cls)
+
     @classmethod
     def is_call(cls, ast: Node) -> bool:
         """
@@ -72,3 +104,11 @@ class Func_Argument(Variable):
 @dataclass
 class Macro(Function):
     pass
+
+
+@dataclass
+class Imported(Variable):
+    """
+    A Variable another module exports, loaded from its interface file.
+    """
+    module: str = ''
@@ -0,0 +1,89 @@
+"""
+The symbol table.
+
+Every symbol name is interned here once, along with its mangled
+(shell-safe) name. Mangled names are also cached by mangle, so nothing
+has to mangle a name more than once.
+
+Two names that mangle to the same shell name (like a-b and aminusb)
+would clobber each other in the output, so that is caught when the
+second one is interned.
+"""
+
+import sys
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+
+MANGLED_CHARS = {
+    '+': 'plus',
+    '-': 'minus',
+    '/': 'div',
+    '*': 'star',
+}
+
+_MANGLE = str.maketrans(MANGLED_CHARS)
+
+
+class ManglingCollision(SyntaxError):
+    """
+    Raised when a name mangles to the same shell name as another one.
+    """
+    def __init__(self, name: str, other: str, mangled: str):
+        super().__init__(("Symbols {} and {} are both {} in the shell!"
+                         ).format(other, name, mangled))
+        self.name = name
+        self.other = other
+        self.mangled = mangled
+
+
+@dataclass
+class SymbolTable:
+    """
+    names maps each interned name to its mangled name, and mangled maps
+    each mangled name back to the name that got it first.
+    """
+    names: dict[str, str] = field(default_factory=dict)
+    mangled: dict[str, str] = field(default_factory=dict)
+
+    def intern(self, name: str) -> str:
+        """
+        Adds name to the table, and returns the one shared copy of it.
+
+        Raises ManglingCollision if another name already mangles to the
+        same shell name.
+        """
+        name = sys.intern(name)
+        if name not in self.names:
+            mangled = name.translate(_MANGLE)
+            other = self.mangled.setdefault(mangled, name)
+            if other != name:
+                raise ManglingCollision(name, other, mangled)
+            self.names[name] = mangled
+        return name
+
+    def mangle(self, name: str) -> str:
+        """ Returns the mangled name for name, interning it first if needed. """
+        try:
+            return self.names[name]
+        except KeyError:
+            return self.names[self.intern(name)]
+
+
+# The table for code that doesn't have one of its own. The reader uses
+# the one in its GlobalState, so compiles don't see each other's names.
+SYMBOLS = SymbolTable()
+
+intern = SYMBOLS.intern
+
+
+@lru_cache(maxsize=1 << 16)
+def mangle(name: str) -> str:
+    """
+    Returns the mangled name for name.
+
+    This doesn't check for collisions (interning does), so it can be
+    shared by every compile.
+    """
+    return name.translate(_MANGLE)
@@ -25,6 +25,7 @@ class Let(Builtin):
     Let binds the variable to the nearest scope.
     """
     name = 'let'
+    search_body = True
 
 
     @staticmethod
@@ -63,7 +64,7 @@ class Let(Builtin):
                 value = ast.children[2]
                 new_variable = Variable(name.data, value)
                 add_var(ast.parent, new_variable)
-                return MacroCall(ast.row, ast.column, ast.children[1:], 
+                return MacroCall(ast.start, ast.end, ast.children[1:], 
                                  None, cls, cls.name, name, [value])
             else:
                 raise SyntaxError(("let only takes three arguments and name can't be Expr\n"
@@ -83,6 +84,7 @@ class Defun(Builtin):
         (defun func_name (arglist) body...)
     """
     name = 'defun'
+    search_body = True
 
 
     @staticmethod
@@ -126,11 +128,11 @@ class Defun(Builtin):
                     if isinstance(node, Comment):
                         continue
                     last_node = node
-                rnode = ReturnNode(last_node.row, last_node.column,
+                rnode = ReturnNode(last_node.start, last_node.end,
                                    [last_node], last_node.parent)
                 body[body.index(last_node)] = rnode
                 last_node.parent = rnode.parent
-                body = Expr((body[0].row, body[-1].row), (body[0].column, body[-1].column),
+                body = Expr(body[0].start, body[-1].end,
                                 body, ast.parent, scope=Scope())
                 for child in body.children:
                     child.parent = body
@@ -139,7 +141,7 @@ class Defun(Builtin):
                 func = Function(body.scope, body, arglist)
                 new_variable = Variable(name, func)
                 add_var(ast.parent, new_variable)
-                macro_call =  MacroCall(ast.row, ast.column, ast.children[1:], 
+                macro_call =  MacroCall(ast.start, ast.end, ast.children[1:], 
                                        None, cls, cls.name, arglist, [body])
                 body.parent = macro_call
                 return macro_call
@@ -164,6 +166,7 @@ class Depun(Builtin):
         (depun func_name (arglist) body...)
     """
     name = 'depun'
+    search_body = True
 
 
     @staticmethod
@@ -208,11 +211,11 @@ class Depun(Builtin):
                     if isinstance(node, Comment):
                         continue
                     last_node = node
-                rnode = ReturnNode(last_node.row, last_node.column,
+                rnode = ReturnNode(last_node.start, last_node.end,
                                    [last_node], None)
                 body[body.index(last_node)] = rnode
                 last_node.parent = rnode
-                body = Expr((body[0].row, body[-1].row), (body[0].column, body[-1].column),
+                body = Expr(body[0].start, body[-1].end,
                                 body, ast.parent, scope=Scope())
                 for child in body.children:
                     child.parent = body
@@ -221,7 +224,7 @@ class Depun(Builtin):
                 func = PureFunction(body.scope, body, arglist)
                 new_variable = Variable(name_data, func)
                 add_var(ast.parent, new_variable)
-                macro_call =  MacroCall(ast.row, ast.column, [name, arglist, body],
+                macro_call =  MacroCall(ast.start, ast.end, [name, arglist, body],
                                        None, cls, cls.name, arglist, [body])
                 body.parent = macro_call
                 return macro_call
@@ -271,7 +274,7 @@ class Shell_Literal(Builtin):
             if cls.valid_syntax(ast):
                 literals = ast.children[1:]
 
-                return MacroCall(ast.row, ast.column, ast.children[1:], 
+                return MacroCall(ast.start, ast.end, ast.children[1:], 
                                  None, cls, cls.name, [], literals)
             else:
                 raise SyntaxError(("shell-literal takes at least two arguments, and arguments must be atoms!\n"
@@ -315,7 +318,7 @@ class Quote(Builtin):
             if cls.valid_syntax(ast):
                 literals = ast.children[1:]
 
-                return MacroCall(ast.row, ast.column, ast.children[1:], 
+                return MacroCall(ast.start, ast.end, ast.children[1:], 
                                  None, cls, cls.name, [], literals)
             else:
                 raise SyntaxError(("quote takes at least two arguments, and arguments must be atoms!\n"
@@ -360,7 +363,7 @@ class QuasiQuote(Builtin):
             if cls.valid_syntax(ast):
                 literals = ast.children[1:]
 
-                return MacroCall(ast.row, ast.column, ast.children[1:], 
+                return MacroCall(ast.start, ast.end, ast.children[1:], 
                                  None, cls, cls.name, [], literals)
             else:
                 raise SyntaxError(("quasi-quote takes at least two arguments\n"
@@ -383,6 +386,7 @@ class Unquote(Builtin):
         ,literal
     """
     name = 'unquote'
+    search_body = True
 
 
     @staticmethod
@@ -402,7 +406,7 @@ class Unquote(Builtin):
         """
         if cls.is_call(ast):
             if cls.valid_syntax(ast):
-                return MacroCall(ast.row, ast.column, ast.children[1:], 
+                return MacroCall(ast.start, ast.end, ast.children[1:], 
                                  None, cls, cls.name, [], ast.children[1])
             else:
                 raise SyntaxError(("unquote takes at least two arguments, and arguments must be atoms!\n"
@@ -424,6 +428,7 @@ class Unquote_Splice(Builtin):
         ,@literal
     """
     name = 'unquote-splice'
+    search_body = True
 
 
     @staticmethod
@@ -443,7 +448,7 @@ class Unquote_Splice(Builtin):
         """
         if cls.is_call(ast):
             if cls.valid_syntax(ast):
-                return MacroCall(ast.row, ast.column, ast.children[1:], 
+                return MacroCall(ast.start, ast.end, ast.children[1:], 
                                  None, cls, cls.name, [], ast.children[1])
             else:
                 raise SyntaxError(("unquote-splice takes at least two arguments, and arguments must be atoms!\n"
@@ -454,6 +459,48 @@ class Unquote_Splice(Builtin):
 
 
 
+@dataclass
+class Import(Builtin):
+    """
+    This defines the built-in meta-macro 'import'.
+
+    Import makes what another module exports available at the top level,
+    from the module's interface file (see interfaces). The names are
+    added to the scope when the metamacro pass expands the import.
+
+    The form for import is as follows:
+        (import module)
+    """
+    name = 'import'
+
+
+    @staticmethod
+    def valid_syntax(ast: Node) -> bool:
+        """
+        Checks if the syntax is called properly or not.
+        """
+        return len(ast.children) == 2 and isinstance(ast.children[1], Symbol)
+
+
+    @classmethod
+    def meta_eval(cls, ast: Node) -> MacroCall:
+        """
+        This evaluates the 'metamacro'.
+
+        the 'ast' is the immediate parent of the 'import' symbol.
+        """
+        if cls.is_call(ast):
+            if cls.valid_syntax(ast):
+                return MacroCall(ast.start, ast.end, ast.children[1:],
+                                 None, cls, cls.name, ast.children[1], [])
+            else:
+                raise SyntaxError(("import takes one argument, the module name!\n"
+                                   "Usage: `(import module)`\n"
+                                   "TODO: Better Error message"))
+        else:
+            return ast
+
+
 @dataclass
 class Demac(Builtin):
     """
@@ -468,6 +515,7 @@ class Demac(Builtin):
         (defmac macroname (arglist) body...)
     """
     name = 'demac'
+    search_body = True
 
 
     @staticmethod
@@ -515,11 +563,11 @@ class Demac(Builtin):
                     if isinstance(node, Comment):
                         continue
                     last_node = node
-                rnode = ReturnNode(last_node.row, last_node.column,
+                rnode = ReturnNode(last_node.start, last_node.end,
                                    [last_node], last_node.parent)
                 body[body.index(last_node)] = rnode
                 last_node.parent = rnode.parent
-                body = Expr((body[0].row, body[-1].row), (body[0].column, body[-1].column),
+                body = Expr(body[0].start, body[-1].end,
                                 body, ast.parent, scope=Scope())
                 for child in body.children:
                     child.parent = body
@@ -528,7 +576,7 @@ class Demac(Builtin):
                 func = Macro(body.scope, body, arglist)
                 new_variable = Variable(name, func)
                 add_var(ast.parent, new_variable)
-                macro_call =  MacroCall(ast.row, ast.column, ast.children[1:],
+                macro_call =  MacroCall(ast.start, ast.end, ast.children[1:],
                                        None, cls, cls.name, arglist, [body])
                 body.parent = macro_call
                 return macro_call
@@ -4,7 +4,9 @@ This handles all transient state that is needed.
 
 import errors
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+from shisp_ast.symbols import SymbolTable
 
 @dataclass
 class GlobalState:
@@ -21,6 +23,8 @@ class GlobalState:
 
     current_file: str
 
+    symbols: SymbolTable = field(default_factory=SymbolTable)
+
     def add_error_file(self, src_file: str, error: errors.ShispError):
         try:
             self.errors = {**self.errors,
@@ -0,0 +1,143 @@
+"""
+Keeps track of how long each stage of the compiler takes, for the
+--timings option.
+"""
+
+import json
+import tracemalloc
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from time import perf_counter
+from typing import Iterator, Optional
+
+from parser.pass_manager import count_nodes
+from shisp_ast.ast import AST
+
+
+# The stages, in the order they run.
+STAGES = (
+    'read',
+    'lex',
+    'parse',
+    'desugar',
+    'squash',
+    'metamacros',
+    'varrefs',
+    'functions',
+    'codegen',
+    'write',
+)
+
+# Bump this when the JSON output changes shape.
+FORMAT = 1
+
+
+@dataclass
+class Stage:
+    """
+    What was measured for a stage.
+
+    peak_bytes is the peak traced memory while the stage ran. tokens is
+    how many lexemes lex made, and nodes how many AST nodes there were
+    after each stage that works on the AST.
+
+    A stage that ran as part of another one (like desugar in the reader,
+    or functions sharing the varrefs walk) has fused_with set to it,
+    and nothing else.
+    """
+    name: str
+    seconds: Optional[float] = None
+    peak_bytes: Optional[int] = None
+    tokens: Optional[int] = None
+    nodes: Optional[int] = None
+    fused_with: Optional[str] = None
+
+
+@dataclass
+class Timings:
+    """
+    Measures the stages of one compile.
+
+    Memory is traced while enabled is set, which slows everything else
+    down, so the times are only good for comparing with each other.
+    Leaving memory unset times the stages without tracing it.
+
+    current is the stage running now, whether or not enabled is set.
+    """
+    file: str
+    enabled: bool = False
+    memory: bool = True
+    stages: dict[str, Stage] = field(default_factory=lambda: {name: Stage(name) for name in STAGES})
+    current: Optional[str] = field(default=None, init=False)
+
+    def start(self):
+        if self.enabled and self.memory:
+            tracemalloc.start()
+
+    def stop(self):
+        if self.enabled and self.memory:
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        """
+        Measures the block as stage name. A stage that is run more than
+        once (like with --stream) adds up its times and keeps its peak.
+        """
+        stage = self.stages[name]
+        self.current = name
+        try:
+            if not self.enabled:
+                yield stage
+                return
+            if self.memory:
+                tracemalloc.reset_peak()
+            start = perf_counter()
+            yield stage
+            seconds = perf_counter() - start
+            stage.seconds = round((stage.seconds or 0) + seconds, 6)
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                stage.peak_bytes = max(stage.peak_bytes or 0, peak)
+        finally:
+            self.current = None
+
+    def counted(self, name: str, ast: AST) -> AST:
+        """
+        Records how many nodes ast has after stage name, and returns it.
+        These add up like the times do, counting the root only once.
+        """
+        if self.enabled:
+            stage = self.stages[name]
+            nodes = count_nodes(ast)
+            stage.nodes = nodes if stage.nodes is None else stage.nodes + nodes - 1
+        return ast
+
+    def fuse(self, name: str, into: str):
+        """ Marks stage name as having run as part of stage into. """
+        self.stages[name].fused_with = into
+
+    def to_json(self) -> str:
+        return json.dumps({'format': FORMAT,
+                           'file': self.file,
+                           'stages': [asdict(stage) for stage in self.stages.values()]},
+                          indent=2)
+
+    def report(self) -> str:
+        def show(value, form):
+            return '-' if value is None else form.format(value)
+
+        lines = ['{:<12}{:>12}{:>12}{:>10}{:>10}'.format('stage', 'seconds', 'peak MB',
+                                                        'tokens', 'nodes')]
+        for stage in self.stages.values():
+            if stage.fused_with is not None:
+                lines.append('{:<12}  (part of {})'.format(stage.name, stage.fused_with))
+                continue
+            lines.append('{:<12}{:>12}{:>12}{:>10}{:>10}'.format(
+                stage.name,
+                show(stage.seconds, '{:.6f}'),
+                show(None if stage.peak_bytes is None else stage.peak_bytes / 1e6, '{:.2f}'),
+                show(stage.tokens, '{}'),
+                show(stage.nodes, '{}')))
+        return '\n'.join(lines)
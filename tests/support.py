@@ -0,0 +1,23 @@
+"""
+Shared helpers for the bootstrap compiler tests.
+
+Importing this module puts src/bootstrap on sys.path, so the tests can
+import the compiler modules the same way main.py does.
+"""
+
+import os
+import subprocess
+import sys
+
+from pathlib import Path
+
+
+BOOTSTRAP = Path(__file__).resolve().parent.parent / 'src' / 'bootstrap'
+sys.path.insert(0, str(BOOTSTRAP))
+
+
+def run_script(script: str, *arguments: str, env: dict = None) -> subprocess.CompletedProcess:
+    """ Runs one of the bootstrap scripts (main.py, client.py, ...). """
+    return subprocess.run([sys.executable, str(BOOTSTRAP / script), *arguments],
+                          capture_output=True, text=True,
+                          env=None if env is None else {**os.environ, **env})
@@ -0,0 +1,26 @@
+import unittest
+
+import support  # noqa: F401, puts the compiler on sys.path
+
+from api import compile_source
+
+
+class CompileSourceTest(unittest.TestCase):
+
+    def test_compiles_have_their_own_names(self):
+        # a-b and aminusb are both aminusb in the shell, which is only a
+        # clash within one program.
+        for options in ([], ['multipass']):
+            with self.subTest(options=options):
+                for name in ('a-b', 'aminusb'):
+                    result = compile_source('(let {} 1)\n'.format(name), options=options)
+                    self.assertTrue(result.ok, result.errors)
+
+    def test_clash_within_a_program(self):
+        result = compile_source('(let a-b 1)\n(let aminusb 2)\n')
+        self.assertFalse(result.ok)
+        self.assertIn('clashes', result.errors[0].output)
+
+
+if __name__ == '__main__':
+    unittest.main()
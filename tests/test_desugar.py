@@ -0,0 +1,68 @@
+import unittest
+
+import support  # noqa: F401, puts the compiler on sys.path
+
+import lexer.tokens
+import parser
+import state
+
+from shisp_ast.ast import Expr, Node
+
+
+SUGAR = {"'": 'quote', '`': 'quasiquote', ',': 'unquote', ',@': 'unquote-splice'}
+
+
+def shape(node: Node):
+    """ The node as nested lists of the data in it. """
+    if isinstance(node, Expr):
+        return [shape(child) for child in node.children]
+    return node.data
+
+
+def multipass(text: str):
+    """ The top-level forms, from the parse, desugar and squash passes. """
+    _state = state.GlobalState(['test'], {}, {}, [], 'test')
+    ast = parser.parse_tokens.parse_lexemes(lexer.tokens.scan(text), _state)
+    ast = parser.desugar_source.combine_ast(ast)
+    return shape(parser.simplify_ast.squash_ast(ast, _state.symbols).base_node)
+
+
+def reader(text: str):
+    """ The top-level forms, from the single pass reader. """
+    _state = state.GlobalState(['test'], {}, {}, [], 'test')
+    return shape(parser.reader.read(lexer.tokens.scan(text), _state).base_node)
+
+
+class DesugarTest(unittest.TestCase):
+
+    def check(self, text: str, expected: list):
+        self.assertEqual(multipass(text), expected)
+        self.assertEqual(reader(text), expected)
+
+    def test_quotes_in_list(self):
+        self.check("'(a 'b `c ,d ,@e)",
+                   [['quote', ['a', ['quote', 'b'], ['quasiquote', 'c'],
+                                ['unquote', 'd'], ['unquote-splice', 'e']]]])
+
+    def test_repeated_quote(self):
+        self.check("''x", [['quote', 'x']])
+        self.check("''(x)", [['quote', ['x']]])
+        self.check("'(a ''b)", [['quote', ['a', ['quote', 'b']]]])
+        self.check("'(''a)", [['quote', [['quote', 'a']]]])
+        self.check(',,x', [['unquote', 'x']])
+
+    def test_splice(self):
+        self.check('`(a ,@b c)', [['quasiquote', ['a', ['unquote-splice', 'b'], 'c']]])
+        self.check('`(a ,@(b c) ,d)',
+                   [['quasiquote', ['a', ['unquote-splice', ['b', 'c']], ['unquote', 'd']]]])
+
+    def test_wide_list(self):
+        # Wider than the recursion limit the old desugar pass ran into
+        sugar = list(SUGAR)
+        items = ['{}item{}'.format(sugar[i % len(sugar)], i) for i in range(3000)]
+        expected = [[SUGAR[sugar[i % len(sugar)]], 'item{}'.format(i)] for i in range(3000)]
+        self.check("'({})\n".format(' '.join(items)), [['quote', expected]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+
+from support import run_script
+
+
+class MainTest(unittest.TestCase):
+    """ Runs main.py on files in a directory of their own. """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def source_file(self, name: str, text: str) -> str:
+        with open(self.path(name), 'w') as f:
+            f.write(text)
+        return self.path(name)
+
+    def compile(self, *arguments: str):
+        return run_script('main.py', *arguments, '--no-prelude')
+
+    def test_interface_with_macro(self):
+        source = self.source_file('mod.shisp', ('(demac twice (x) `(,x ,x))\n'
+                                                '(defun greet (name) name)\n'))
+        for mode in ([], ['--stream']):
+            with self.subTest(mode=mode):
+                result = self.compile(source, self.path('mod.sh'), '--interface', *mode)
+                self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+                with open(self.path('mod.shispi')) as f:
+                    exports = {export['name']: export for export in json.load(f)['exports']}
+                self.assertEqual(exports['twice']['source'], '(demac twice (x) `(,x ,x))')
+                self.assertEqual(exports['greet']['args'], ['name'])
+
+    def test_cached_interface_module(self):
+        # Two modules with the same source, each interface names its own
+        cache = '--cache=' + self.path('cache')
+        for module in ('a', 'b'):
+            source = self.source_file(module + '.shisp', '(defun greet (name) name)\n')
+            result = self.compile(source, '--interface', cache)
+            self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+            with open(self.path(module + '.shispi')) as f:
+                self.assertEqual(json.load(f)['module'], module)
+
+    def test_no_interface_without_script(self):
+        # Compiling the quoted list fails after the passes, in codegen
+        source = self.source_file('broken.shisp', "(let x 1)\n(let y '(a))\n")
+        result = self.compile(source, '--interface')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertFalse(os.path.exists(self.path('broken.sh')))
+        self.assertFalse(os.path.exists(self.path('broken.shispi')))
+
+    def test_failed_stream_keeps_output(self):
+        source = self.source_file('program.shisp', '(let a 1)\n(let b "x\n')
+        output = self.source_file('program.sh', 'old\n')
+        result = self.compile(source, '--stream')
+        self.assertEqual(result.returncode, 1)
+        with open(output) as f:
+            self.assertEqual(f.read(), 'old\n')
+        self.assertEqual(sorted(os.listdir(self.directory)), ['program.sh', 'program.shisp'])
+
+    def test_missing_file(self):
+        missing = self.path('missing.shisp')
+        source = self.source_file('program.shisp', '(let x 1)\n')
+        for mode in ([], ['--stream']):
+            with self.subTest(mode=mode):
+                result = self.compile(missing, *mode)
+                self.assertEqual(result.returncode, 1)
+                self.assertEqual(result.stdout, 'File {} not found!\n'.format(missing))
+                result = run_script('main.py', source, '--prelude=' + missing, *mode)
+                self.assertEqual(result.returncode, 1)
+                self.assertEqual(result.stdout, 'File {} not found!\n'.format(missing))
+
+    def test_profile(self):
+        good = self.source_file('good.shisp', '(let x 1)\n')
+        broken = self.source_file('broken.shisp', "(let x 1)\n(let y '(a))\n")
+        for source in (good, broken):
+            with self.subTest(source=source):
+                profile = self.path('profile.txt')
+                self.compile(source, '--profile=' + profile)
+                self.assertTrue(os.path.exists(profile))
+                os.unlink(profile)
+
+    def test_profile_of_several_files(self):
+        sources = [self.source_file(name, '(let x 1)\n') for name in ('a.shisp', 'b.shisp')]
+        result = self.compile(*sources, '--profile=' + self.path('profile.txt'))
+        self.assertEqual(result.returncode, 2)
+        self.assertIn('--profile only takes one in_file', result.stdout)
+        self.assertFalse(os.path.exists(self.path('a.sh')))
+
+    def test_usage_errors(self):
+        source = self.source_file('program.shisp', '(let x 1)\n')
+        for arguments in ([], ['--timings'], [source, '-j', 'x'], [source, '-j', '0'], [source, '-o']):
+            with self.subTest(arguments=arguments):
+                result = run_script('main.py', *arguments)
+                self.assertEqual(result.returncode, 2)
+                self.assertIn('usage: python3 main.py', result.stdout)
+
+    def test_read_jobs(self):
+        source = self.source_file('program.shisp', '(let x 1)\n')
+        result = self.compile(source, '--read-jobs=2')
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        for value in ('0', '-1', 'x', ''):
+            with self.subTest(value=value):
+                result = self.compile(source, '--read-jobs=' + value)
+                self.assertEqual(result.returncode, 2)
+                self.assertIn('--read-jobs takes a positive number', result.stdout)
+                self.assertEqual(result.stderr, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+import support  # noqa: F401, puts the compiler on sys.path
+
+import lexer.tokens
+import parser.parallel_reader
+import parser.reader
+import state
+
+from errors import AbortParse
+from shisp_ast.ast import Expr, Node
+
+
+FORMS = """; form {n}, with a ) in a comment
+(let value{n} "a string with ( in it {n}")
+(defun func{n} (a b)
+  ; a comment inside a form
+  (shell-literal echo "{n} )") 'a `(b ,a ,@(c d)))
+"""
+
+JOBS = 2
+
+
+def program(size: int, last: str = '', first: str = '') -> str:
+    """ Enough forms to make size bytes, between first and last. """
+    forms = [first]
+    total = 0
+    while total < size:
+        forms.append(FORMS.format(n=len(forms) - 1))
+        total += len(forms[-1])
+    return ''.join(forms) + last
+
+
+def shape(node: Node):
+    data = [shape(child) for child in node.children] if isinstance(node, Expr) else node.data
+    return type(node).__name__, node.start, node.end, data
+
+
+def read_both(text: str):
+    """
+    Reads text with parallel_reader.read_file and with reader.read.
+    Returns the AST (or None if it failed) and errors of each.
+    """
+    source = text.encode('utf-8')
+    with tempfile.TemporaryDirectory() as directory:
+        # The workers read the chunks from the file
+        file_name = os.path.join(directory, 'test.shisp')
+        with open(file_name, 'wb') as f:
+            f.write(source)
+        results = []
+        for read in (lambda _state: parser.parallel_reader.read_file(file_name, source,
+                                                                     _state, JOBS),
+                     lambda _state: parser.reader.read(lexer.tokens.scan(source), _state)):
+            _state = state.GlobalState([file_name], {}, {}, [], file_name)
+            try:
+                ast = read(_state)
+            except AbortParse:
+                ast = None
+            results.append((ast, [error.output for error in _state.errors.get(file_name, [])]))
+    return results
+
+
+class ParallelReaderTest(unittest.TestCase):
+
+    def chunk_count(self, text: str) -> int:
+        source = text.encode('utf-8')
+        size = max(parser.parallel_reader.MIN_CHUNK, len(source) // (4 * JOBS))
+        ends = parser.parallel_reader.form_ends(source)
+        return len(parser.parallel_reader.chunks(ends, size, len(source)))
+
+    def test_same_ast(self):
+        text = program(300_000, '; a comment after the last form\n')
+        self.assertGreater(self.chunk_count(text), 2)
+        (parallel, parallel_errors), (whole, whole_errors) = read_both(text)
+        self.assertEqual(parallel_errors, [])
+        self.assertEqual(whole_errors, [])
+        self.assertEqual(shape(parallel.base_node), shape(whole.base_node))
+        offsets = range(0, len(text.encode('utf-8')), 997)
+        self.assertEqual([parallel.lines.position(offset) for offset in offsets],
+                         [whole.lines.position(offset) for offset in offsets])
+
+    def test_errors_in_later_chunks(self):
+        for first, last in (('', '(let broken "no end\n)\n'),
+                            ('', '(let a-b 1)\n(let aminusb 2)\n'),
+                            ('(let a-b 1)\n', '(let aminusb 2)\n')):
+            with self.subTest(first=first, last=last):
+                text = program(300_000, last, first)
+                self.assertGreater(self.chunk_count(text), 2)
+                (parallel, parallel_errors), (whole, whole_errors) = read_both(text)
+                self.assertIsNone(parallel)
+                self.assertIsNone(whole)
+                self.assertNotEqual(whole_errors, [])
+                self.assertEqual(parallel_errors, whole_errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from support import run_script
+
+import state
+
+from build_cache import BuildCache
+from prelude import load_prelude
+from shisp_ast.data_nodes import Macro
+
+
+PRELUDE = '(demac twice (x) `(,x ,x))\n(let greeting "hi")\n'
+
+
+class PreludeTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = os.path.join(self.directory, 'cache')
+
+    def source_file(self, name: str, text: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_snapshot_keeps_macros(self):
+        prelude = self.source_file('prelude.shisp', PRELUDE)
+        _state = state.GlobalState(['x'], {}, {}, ['prelude=' + prelude, 'cache=' + self.cache], 'x')
+        snapshot = load_prelude(_state)
+        variables = {variable.name: variable for variable in snapshot.variables}
+        self.assertIsInstance(variables['twice'].value, Macro)
+        self.assertEqual(snapshot.script, 'greeting="hi"\n')
+
+    def test_compile_with_macro_in_prelude(self):
+        prelude = self.source_file('prelude.shisp', PRELUDE)
+        program = self.source_file('program.shisp', '(let z greeting)\n')
+        output = os.path.join(self.directory, 'program.sh')
+        result = run_script('main.py', program, output, '--prelude=' + prelude,
+                            '--cache=' + self.cache)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        with open(output) as f:
+            self.assertIn('greeting="hi"\n', f.read())
+
+    def test_cache_key_has_prelude(self):
+        program = self.source_file('program.shisp', '(let z 1)\n')
+        cache = BuildCache(self.cache)
+        without = cache.key(program, [])
+        prelude = self.source_file('prelude.shisp', PRELUDE)
+        first = cache.key(program, [], prelude)
+        self.source_file('prelude.shisp', '(let greeting "hello")\n')
+        second = cache.key(program, [], prelude)
+        self.assertEqual(len({without, first, second}), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from support import run_script
+
+import lexer.tokens
+import parser.reader
+import state
+
+
+def read_text(text: str) -> list[str]:
+    """ The top-level forms read_forms hands on, as their node types. """
+    _state = state.GlobalState(['test'], {}, {}, [], 'test')
+    source = text.encode('utf-8')
+    tokens = lexer.tokens.TokenStore(source, lines=lexer.tokens.LineIndex(source=source))
+    lexemes = lexer.tokens.lex(source, tokens.lines)
+    return [[type(node).__name__ for node in ast.base_node.children]
+            for ast in parser.reader.read_forms(tokens, lexemes, _state)]
+
+
+class ReadFormsTest(unittest.TestCase):
+
+    def test_forms(self):
+        self.assertEqual(read_text('(a) b\n'), [['Expr'], ['Symbol']])
+
+    def test_open_form_at_end(self):
+        self.assertEqual(read_text('(a)\n(b (c'), [['Expr'], ['Expr']])
+
+    def test_sugar_at_end(self):
+        self.assertEqual(read_text("(a)\n'(b"), [['Expr'], ['Expr']])
+
+
+class StreamTest(unittest.TestCase):
+    """ --stream has to compile what reading the whole file does. """
+
+    def compile(self, text: str, *options: str) -> str:
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'program.shisp')
+            output = os.path.join(directory, 'program.sh')
+            with open(source, 'w') as f:
+                f.write(text)
+            result = run_script('main.py', source, output, '--no-prelude', *options)
+            self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+            with open(output) as f:
+                return f.read()
+
+    def test_open_form_at_end(self):
+        for text in ('(let a 1)\n(let b 2', '(let a 1)\n(shell-literal echo a',
+                     '(let a 1)\n(let b 2)'):
+            with self.subTest(text=text):
+                self.assertEqual(self.compile(text, '--stream'), self.compile(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from support import BOOTSTRAP, run_script
+
+
+class ServerTest(unittest.TestCase):
+    """ Runs server.py on a socket of its own, and client.py against it. """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.socket = os.path.join(cls.directory.name, 'shisp.sock')
+        cls.server = subprocess.Popen(
+            [sys.executable, str(BOOTSTRAP / 'server.py'), '--socket=' + cls.socket, '-j', '1'],
+            stdout=subprocess.PIPE, text=True)
+        # It says so once it is listening
+        cls.server.stdout.readline()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.terminate()
+        cls.server.wait()
+        cls.server.stdout.close()
+        cls.directory.cleanup()
+
+    def source_file(self, name: str, text: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def client(self, *arguments: str) -> subprocess.CompletedProcess:
+        return run_script('client.py', *arguments, env={'SHISP_SOCKET': self.socket})
+
+    def request(self, message: dict) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(self.socket)
+            connection.sendall(json.dumps(message).encode('utf-8'))
+            connection.shutdown(socket.SHUT_WR)
+            with connection.makefile('rb') as replies:
+                return json.loads(replies.readline())
+
+    def test_compile(self):
+        source = self.source_file('good.shisp', '(let x 1)\n')
+        output = os.path.join(self.directory.name, 'good.sh')
+        result = self.client(source, output, '--no-prelude')
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertTrue(os.path.exists(output))
+
+    def test_failed_compile(self):
+        source = self.source_file('bad.shisp', '(let x "a\n')
+        output = os.path.join(self.directory.name, 'bad.sh')
+        result = self.client(source, output, '--no-prelude')
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('bad.shisp', result.stdout)
+
+    def test_missing_file(self):
+        result = self.client(os.path.join(self.directory.name, 'missing.shisp'))
+        self.assertEqual(result.returncode, 1)
+
+    def test_source(self):
+        reply = self.request({'source': '(let x 1)\n', 'options': ['no-prelude']})
+        self.assertEqual(reply['status'], 0, reply['output'])
+        self.assertIn('x=1', reply['script'])
+
+    def test_large_source(self):
+        # Bigger than what asyncio reads as one line by default
+        source = ''.join('(let x{} {})\n'.format(n, n) for n in range(10000))
+        self.assertGreater(len(source), 1 << 16)
+        reply = self.request({'source': source, 'options': ['no-prelude']})
+        self.assertEqual(reply['status'], 0, reply['output'])
+        self.assertIn('x9999=9999', reply['script'])
+
+    def test_source_compiler_error(self):
+        # The compiler can't yet let a name be a quoted list, which fails
+        # with an error that isn't a SyntaxError.
+        reply = self.request({'source': "(let x '(a))\n", 'filename': 'quote.shisp',
+                              'options': ['no-prelude']})
+        self.assertEqual(reply['status'], 1)
+        self.assertIn('quote.shisp', reply['output'])
+        self.assertIsNone(reply['script'])
+
+
+if __name__ == '__main__':
+    unittest.main()